@@ -1,16 +1,50 @@
 import re
 import os
-import json
-import sqlite3
+import time
+import asyncio
 import autogen
 from autogen import AssistantAgent
 from dotenv import load_dotenv
+from llm_cache import LLMCache, CacheMiss
+from mock_llm import MockModelClient
+from prefix_cache import PrefixCache
+from rate_limiter import RateLimiter, split_limits
+from metrics import run_metrics, estimate_tokens
+import trace_log
+from sql_validator import run_sql_safely, fetch_result, result_fingerprint, summarize_rows, check_result
+from sql_checker import autorepair
+from foreign_keys import ForeignKeyGraph, get_graph
+from schema_extractor import parse_selection, apply_selection, render_schema, truncate_schema
 
 load_dotenv()
 
 # --- Config ---
-config_list_gemini = autogen.config_list_from_json("model_config.json")
+# Optional "rpm"/"tpm" keys in each entry configure the client-side rate limiter.
+# MODEL_CONFIG points at another config file, e.g. a mock backend for benchmarks.
+MODEL_CONFIG = os.environ.get("MODEL_CONFIG", "model_config.json")
+config_list_gemini, config_limits = split_limits(autogen.config_list_from_json(MODEL_CONFIG))
+limiter = RateLimiter(config_limits)
 MAX_RETRIES = 3
+# Self-consistency: Decomposer samples per question and how many matching results end the vote early.
+# Set by configure_sampling(); one sample keeps the single greedy candidate.
+SAMPLES = 1
+QUORUM = None
+SAMPLE_TEMPERATURE = 0.7
+# Prompts estimated above this many tokens get their schema truncated; None disables it.
+PROMPT_BUDGET = None
+
+# Set by configure_cache(); None disables response caching.
+llm_cache: LLMCache | None = None
+# Set by configure_prefix_cache(); counts prompt prefixes the provider could serve from its cache.
+prefix_cache: PrefixCache | None = None
+# Set by configure_examples(); the Decomposer's static worked examples once they are out of its system message.
+static_examples = ""
+
+def use_model_client(agent: AssistantAgent) -> AssistantAgent:
+    # Entries with "model_client_cls": "MockModelClient" are served offline from recorded runs.
+    if any(entry.get("model_client_cls") == MockModelClient.__name__ for entry in agent.llm_config["config_list"]):
+        agent.register_model_client(model_client_cls=MockModelClient, agent_name=agent.name)
+    return agent
 
 # --- Agent Definitions ---
 
@@ -247,6 +281,13 @@ decomposer = AssistantAgent(
     )
 )
 
+# Same prompt as the Decomposer, sampled at a higher temperature for self-consistency voting.
+decomposer_sampler = AssistantAgent(
+    name="DecomposerSampler",
+    llm_config={"config_list": config_list_gemini, "temperature": SAMPLE_TEMPERATURE},
+    system_message=decomposer.system_message,
+)
+
 refiner = AssistantAgent(
     name="Refiner",
     llm_config={"config_list": config_list_gemini},
@@ -272,36 +313,251 @@ refiner = AssistantAgent(
     )
 )
 
+for agent in (selector, decomposer, decomposer_sampler, refiner):
+    use_model_client(agent)
+
 # --- Utility Functions ---
 
-def run_sql_safely(db_dir: str,db_id: str, sql: str) -> tuple[bool, str, str]:
-    db_path = os.path.join(db_dir, db_id, f"{db_id}.sqlite")
-    if not os.path.exists(db_path):
-        return False, f"Database not found: {db_path}", "FileNotFoundError"
-    try:
-        with sqlite3.connect(db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.execute(sql)
-        return True, "", ""
-    except Exception as e:
-        return False, str(e), e.__class__.__name__
-
-def get_foreign_keys(db_id: str, data_dir: str) -> str:
-    fk_file_path = f"{data_dir}/dev_tables.json"
-    try:
-        with open(fk_file_path, "r", encoding="utf-8") as f:
-            fk_data = json.load(f)
-        table_info = fk_data.get(db_id, {})
-        fks = table_info.get("foreign_keys", [])
-        lines = [f"{fk[0]}.{fk[1]} = {fk[2]}.{fk[3]}" for fk in fks]
-        return "\n".join(lines)
-    except Exception as e:
-        return ""
+def configure_cache(cache: LLMCache | None):
+    global llm_cache
+    llm_cache = cache
+
+def configure_prefix_cache(cache: PrefixCache | None):
+    global prefix_cache
+    prefix_cache = cache
+
+def strip_examples(system_message: str) -> str:
+    # The worked examples start at the first "==========" line; keep only the instructions.
+    instructions = system_message.split("==========")[0].rstrip()
+    return instructions.removesuffix("Here is a typical example:").rstrip() + "\n"
+
+def static_examples_of(system_message: str) -> str:
+    """The worked examples strip_examples() removes, without the separator lines."""
+    _, _, examples = system_message.partition("==========")
+    return "\n".join(line for line in examples.strip().splitlines() if line.strip() != "==========").strip()
+
+def configure_examples(dynamic: bool):
+    """
+    With dynamic few-shot examples, drop the hard-coded examples from the Decomposer system
+    messages; solve() then puts the retrieved examples into each prompt instead. The Selector keeps
+    its example, the only one showing its JSON output format. A question without similar solved
+    questions gets the static Decomposer examples in its prompt. Done once before any call, because
+    the agents are shared by every concurrent question.
+    """
+    global static_examples
+    if dynamic:
+        static_examples = static_examples_of(decomposer.system_message)
+        for agent in (decomposer, decomposer_sampler):
+            agent.update_system_message(strip_examples(agent.system_message))
+
+def configure_budget(max_prompt_tokens: int | None):
+    global PROMPT_BUDGET
+    PROMPT_BUDGET = max_prompt_tokens
+
+def fit_to_budget(build_prompt, schema: str, tables: list[dict] | None) -> tuple[str, bool]:
+    """
+    Build the prompt for schema; if it is over PROMPT_BUDGET, rebuild it with the schema
+    truncated to whatever room the rest of the prompt leaves. Returns (prompt, truncated).
+    """
+    prompt = build_prompt(schema)
+    if PROMPT_BUDGET is None or not tables or estimate_tokens(prompt) <= PROMPT_BUDGET:
+        return prompt, False
+    room = PROMPT_BUDGET - (estimate_tokens(prompt) - estimate_tokens(schema))
+    return build_prompt(truncate_schema(tables, max(0, room) * 4)), True
+
+def configure_sampling(samples: int, quorum: int | None = None):
+    global SAMPLES, QUORUM
+    SAMPLES = max(1, samples)
+    QUORUM = quorum
+
+def extract_sql(reply: str) -> str:
+    # The Decomposer answers every sub question; the last SQL block answers the full question.
+    blocks = re.findall(r"```sql\s*(.*?)```", reply, re.S)
+    if blocks:
+        return blocks[-1].strip()
+    return re.sub(r"```sql\s*|\s*```", "", reply).strip()
+
+def normalize_sql(sql: str) -> str:
+    # Candidates that only differ in whitespace or a trailing semicolon run the same query.
+    return " ".join(sql.split()).rstrip(";").strip()
+
+def model_name(agent: AssistantAgent) -> str:
+    return agent.llm_config["config_list"][0]["model"]
+
+_endpoint_agents: dict[tuple[str, int], AssistantAgent] = {}
+
+def endpoint_agent(agent: AssistantAgent, index: int) -> AssistantAgent:
+    """A copy of agent bound to config_list entry `index` only, so failover is under our control."""
+    if len(config_list_gemini) == 1:
+        return agent
+    key = (agent.name, index)
+    clone = _endpoint_agents.get(key)
+    if clone is None:
+        clone = use_model_client(AssistantAgent(
+            name=agent.name,
+            llm_config={**agent.llm_config, "config_list": [config_list_gemini[index]]},
+            system_message=agent.system_message,
+        ))
+        _endpoint_agents[key] = clone
+    return clone
+
+async def ask(agent: AssistantAgent, prompt: str, sample: int = 0, truncated: bool = False,
+              prefix: str = "", history: list[dict] | None = None) -> str:
+    """
+    prefix is the leading part of prompt that is the same for every question on the database;
+    together with the system message it is what a provider-side prefix cache can reuse.
+    history holds earlier turns of a multi-turn session; prompt is sent as the next user turn.
+    """
+    history = history or []
+    messages = history + [{"role": "user", "content": prompt}]
+    prompt_tokens = estimate_tokens(agent.system_message + "".join(m["content"] for m in messages))
+    started = time.perf_counter()
+    key = None
+    if llm_cache is not None:
+        key = llm_cache.make_key(agent.name, agent.system_message, model_name(agent), messages, sample)
+        # SQLite reads and writes stay off the event loop so workers do not queue behind disk I/O.
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            latency = time.perf_counter() - started
+            run_metrics.record_call(agent.name, prompt_tokens, estimate_tokens(cached),
+                                    latency, cached=True, truncated=truncated)
+            trace_log.record_call(agent.name, agent.system_message, prompt, cached, latency, cached=True)
+            return cached
+        if llm_cache.replay:
+            raise CacheMiss(f"No cached {agent.name} reply for this prompt (replay mode)")
+
+    cached_prompt_tokens = 0
+    if prefix_cache is not None:
+        # Earlier turns of a session are resent ahead of the prompt, so they are part of the prefix.
+        shared = "".join(m["content"] for m in history) + prefix
+        cached_prompt_tokens = prefix_cache.lookup(model_name(agent), agent.system_message, shared)
+    # a_generate_reply runs the blocking client call in the loop's executor,
+    # so several questions can wait on the model at the same time.
+    reply, retries = await limiter.run(
+        lambda index: endpoint_agent(agent, index).a_generate_reply(messages=messages),
+        prompt_tokens,
+    )
+    content = reply["content"] if isinstance(reply, dict) else reply
+    latency = time.perf_counter() - started
+    run_metrics.record_call(agent.name, prompt_tokens, estimate_tokens(content or ""),
+                            latency, retries=retries, truncated=truncated,
+                            cached_prompt_tokens=cached_prompt_tokens)
+    trace_log.record_call(agent.name, agent.system_message, prompt, content, latency, cached=False)
+    if key is not None and content:
+        await asyncio.to_thread(llm_cache.put, key, agent.name, model_name(agent), content)
+    return content
 
 # --- Main solve() Function ---
 
-def solve(db_dir: str, data_dir: str, question: str, schema: str, db_id: str, evidence: str = "") -> str:
-    fk_str = get_foreign_keys(db_id, data_dir)
+async def validate(db_dir: str, db_id: str, sql: str, tables: list[dict] | None) -> tuple[str, bool, str, str]:
+    # Unambiguous identifier typos are fixed locally so they never cost a Refiner round-trip.
+    with run_metrics.stage("validation"):
+        if tables:
+            sql, fixes = await asyncio.to_thread(autorepair, db_dir, db_id, sql, tables)
+            if fixes:
+                print("Auto-repaired SQL:", "; ".join(fixes))
+        success, sql_error, exception_class = await asyncio.to_thread(run_sql_safely, db_dir, db_id, sql)
+    return sql, success, sql_error, exception_class
+
+async def vote(db_dir: str, db_id: str, decomposer_prompt: str, tables: list[dict] | None,
+               truncated: bool = False) -> tuple[str, bool, str, str]:
+    """
+    Sample up to SAMPLES Decomposer candidates, execute each as soon as it arrives and return the
+    SQL whose result set most candidates agree on. Only QUORUM samples start at once; another is
+    started only when the ones still running could no longer reach a quorum, so agreeing samples
+    leave the remaining quota unused. A sample that fails, or whose result is empty or all NULL,
+    casts no vote. If no candidate votes, the first executable one (or the first one, with its
+    error for the Refiner) is returned. The returned result goes through the same --suspicious
+    checks as a single candidate, failing with SuspiciousResult.
+    """
+    quorum = min(QUORUM or SAMPLES // 2 + 1, SAMPLES)
+
+    async def candidate(i: int):
+        sql = ""
+        try:
+            # Sample 0 is the usual greedy Decomposer reply, so it shares its cache entry.
+            if i == 0:
+                reply = await ask(decomposer, decomposer_prompt, truncated=truncated)
+            else:
+                reply = await ask(decomposer_sampler, decomposer_prompt, sample=i, truncated=truncated)
+            sql = extract_sql(reply)
+            with run_metrics.stage("validation"):
+                if tables:
+                    sql, _ = await asyncio.to_thread(autorepair, db_dir, db_id, sql, tables)
+                success, rows, sql_error, exception_class = await asyncio.to_thread(fetch_result, db_dir, db_id, sql)
+        except Exception as e:
+            print(f"Self-consistency: sample {i} failed ({e.__class__.__name__}: {e})")
+            return i, sql, False, None, f"{e.__class__.__name__}: {e}", e.__class__.__name__, e
+        return i, sql, success, rows, sql_error, exception_class, None
+
+    running = set()
+    launched = 0
+    votes = {}
+    results = {}
+    rows_of = {}
+    failures = []
+    try:
+        while True:
+            best = max((len(group) for group in votes.values()), default=0)
+            if best >= quorum:
+                break
+            while launched < SAMPLES and best + len(running) < quorum:
+                running.add(asyncio.create_task(candidate(launched)))
+                launched += 1
+            if not running:
+                break
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for finished in done:
+                i, sql, success, rows, sql_error, exception_class, error = finished.result()
+                if error is not None:
+                    failures.append((i, error))
+                    continue
+                results[i] = (sql, success, sql_error, exception_class)
+                rows_of[i] = rows
+                if not success or not any(value is not None for row in rows for value in row):
+                    continue
+                votes.setdefault(result_fingerprint(rows), []).append(i)
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    if not results:
+        # Every sample raised; surface the first error as the single-sample path would.
+        raise min(failures, key=lambda failure: failure[0])[1]
+    if votes:
+        # Most votes wins; ties go to the group containing the lowest sample index.
+        winners = max(votes.values(), key=lambda group: (len(group), -min(group)))
+        print(f"Self-consistency: {len(winners)}/{launched} candidates agree")
+        chosen = min(winners)
+    else:
+        executable = [i for i, result in results.items() if result[1]]
+        if not executable:
+            return results[min(results)]
+        chosen = min(executable)
+    sql = results[chosen][0]
+    problem = check_result(summarize_rows(rows_of[chosen]))
+    if problem:
+        return sql, False, problem, "SuspiciousResult"
+    return sql, True, "", ""
+
+async def solve(db_dir: str, data_dir: str, question: str, schema: str, db_id: str, evidence: str = "",
+                tables: list[dict] | None = None, value_hints: str = "", foreign_keys: list | None = None,
+                examples: str = "", prompt_tables: list[dict] | None = None) -> str:
+    """
+    tables is the full catalog entry, used for auto-repair and to resolve the Selector's choice;
+    prompt_tables are the tables rendered in schema (e.g. after pruning), defaulting to tables.
+    """
+    # Foreign-key edges come from the schema catalog entry; read dev_tables.json only without one.
+    fk_graph = get_graph(data_dir, db_id) if foreign_keys is None else ForeignKeyGraph(foreign_keys)
+    fk_str = fk_graph.render()
+    # Stored values matching the question's keywords, so literals are not guessed.
+    values_section = f"[Matched values]\n        {value_hints}\n        " if value_hints else ""
+    # Solved questions similar to this one, replacing the static examples of the system messages.
+    examples_section = f"[Similar solved questions]\n{examples}\n        " if examples else ""
+    decomposer_examples = examples_section
+    if not examples and static_examples:
+        decomposer_examples = f"[Worked examples]\n{static_examples}\n        "
     full_prompt = f"Question: {question}\nDB_ID: {db_id}"
 
     if evidence:
@@ -311,61 +567,96 @@ def solve(db_dir: str, data_dir: str, question: str, schema: str, db_id: str, ev
 
 
     # Step 1: Selector
-    selector_prompt = f"""
+    def selector_prompt_for(schema_text):
+        return f"""
         Here is a new example, please start answering:
         [DB_ID] {db_id}
         [Schema]
-        {schema}
+        {schema_text}
         [Foreign keys]
         {fk_str}
         [Question]
         {question}
         [Evidence]
         {evidence}
-        [Answer]
+        {values_section}{examples_section}[Answer]
     """
+    # Truncation has to start from the tables actually shown, or it could re-add pruned ones.
+    shown_tables = tables if prompt_tables is None else prompt_tables
+    selector_prompt, truncated = fit_to_budget(selector_prompt_for, schema, shown_tables)
+    # Schema and foreign keys come before the question, so this part is shared by every
+    # question on the database (unless the schema was pruned per question).
+    selector_prefix = selector_prompt[:selector_prompt.find("[Question]")]
     print("size of prompt:", len(selector_prompt))
-    selector_reply = selector.generate_reply(messages=[{"role": "user", "content": selector_prompt}])
-    selections = selector_reply["content"]
+    selections = await ask(selector, selector_prompt, truncated=truncated, prefix=selector_prefix)
+
+    # Render the selected tables/columns from the catalog (with types and descriptions) for
+    # the Decomposer and Refiner, instead of forwarding the raw JSON reply. Without a usable
+    # selection they get the schema the Selector was shown.
+    selected_schema = schema
+    selected_tables = shown_tables
+    selection = parse_selection(selections) if shown_tables else None
+    if selection is not None:
+        selected_tables = apply_selection(shown_tables, selection, fk_graph.edges)
+        selected_schema = render_schema(selected_tables)
 
     # Step 2: Decomposer
-    decomposer_prompt = f"""
+    def decomposer_prompt_for(schema_text):
+        return f"""
         [Database schema]
-        {selections}
+        {schema_text}
         [Foreign keys]
         {fk_str}
         [Question]
         {question}
         [Evidence]
         {evidence}
-        Decompose the question into sub questions, considering [Constraints], and generate the SQL after
+        {values_section}{decomposer_examples}Decompose the question into sub questions, considering [Constraints], and generate the SQL after
         thinking step by step
     """
+    decomposer_prompt, truncated = fit_to_budget(decomposer_prompt_for, selected_schema, selected_tables)
     print("size of prompt:", len(decomposer_prompt))
-    decomposer_reply = decomposer.generate_reply(messages=[{"role": "user", "content": decomposer_prompt}])
-    sql = decomposer_reply["content"]
-    # print("After decomposer SQL:", sql)
-    sql_only = re.sub(r"```sql\s*|\s*```", "", sql).strip()
+    if SAMPLES > 1:
+        # Steps 2-3 with self-consistency: several candidates, majority result wins.
+        sql_only, success, sql_error, exception_class = await vote(db_dir, db_id, decomposer_prompt, tables, truncated)
+        sql = sql_only
+        trace_log.record_attempt("vote", sql_only, success, sql_error, exception_class)
+    else:
+        sql = await ask(decomposer, decomposer_prompt, truncated=truncated)
+        # print("After decomposer SQL:", sql)
+        # Same extraction as the voted samples, so one reply gives one candidate either way.
+        sql_only = extract_sql(sql)
 
-    # Step 3: Initial Execution
-    success, sql_error, exception_class = run_sql_safely(db_dir, db_id, sql_only)
+        # Step 3: Initial Execution
+        sql_only, success, sql_error, exception_class = await validate(db_dir, db_id, sql_only, tables)
+        trace_log.record_attempt("decomposer", sql_only, success, sql_error, exception_class)
 
-    # Step 4: Retry loop using Refiner if needed
+    # Step 4: Retry loop using Refiner if needed.
+    # One conversation per question: the first exchange carries the schema and the failing SQL and
+    # is replayed on every retry; later turns only send the latest candidate and its error and are
+    # not replayed, so each call costs the same instead of growing with the attempts.
+    # A candidate that was already tried is not executed again.
+    tried = {normalize_sql(sql_only): (sql_error, exception_class)}
+    # Latest candidate that ran but whose result was flagged as suspicious.
+    last_executable = sql_only if exception_class == "SuspiciousResult" else None
+    history = []
+    repeated = False
     attempts = 0
     while not success and attempts < MAX_RETRIES:
 
-        refiner_prompt = f"""
+        def refiner_prompt_for(schema_text):
+            return f"""
             [Query]
             {question}
             [Evidence]
             {evidence}
             [Database info]
-            {schema}
+            {schema_text}
             [Foreign keys]
             {fk_str}
             [old SQL]
             ”’ sql
-            {sql}
+            {sql_only}
             ”’
             [SQLite error]
             {sql_error}
@@ -374,27 +665,56 @@ def solve(db_dir: str, data_dir: str, question: str, schema: str, db_id: str, ev
             Now please fixup old SQL and generate new SQL again.
             [correct SQL]
         """
-        
-        print("size of prompt:", len(refiner_prompt))
-        refiner_reply = refiner.generate_reply(messages=[{"role": "user", "content": refiner_prompt}])
-        final = refiner_reply["content"]
 
-        sql_only = re.sub(r"FINAL\s*", "", final)
-        sql_only = re.sub(r"```sql\s*|\s*```", "", sql_only).strip()
+        if not history:
+            refiner_prompt, truncated = fit_to_budget(refiner_prompt_for, selected_schema, selected_tables)
+        else:
+            note = "This SQL was already tried earlier and failed the same way; write a different query.\n            " if repeated else ""
+            refiner_prompt = f"""
+            {note}[old SQL]
+            ”’ sql
+            {sql_only}
+            ”’
+            [SQLite error]
+            {sql_error}
+            [Exception class]
+            {exception_class}
+            Now please fixup this SQL and generate new SQL again.
+            [correct SQL]
+        """
+            truncated = False
+        print("size of prompt:", len(refiner_prompt) + sum(len(m["content"]) for m in history))
+        final = await ask(refiner, refiner_prompt, truncated=truncated, history=history)
+
+        candidate = re.sub(r"FINAL\s*", "", final)
+        candidate = re.sub(r"```sql\s*|\s*```", "", candidate).strip()
+        if not history:
+            # Only the extracted SQL is kept as the Refiner's turn, so the history stays small.
+            history = [{"role": "user", "content": refiner_prompt},
+                       {"role": "assistant", "content": f"```sql\n{candidate}\n```"}]
+        attempts += 1
+
+        repeated = normalize_sql(candidate) in tried
+        if repeated:
+            sql_only = candidate
+            sql_error, exception_class = tried[normalize_sql(candidate)]
+            print(f"Refiner repeated an earlier candidate at attempt {attempts}")
+            trace_log.record_attempt(f"refiner_{attempts}", candidate, False, sql_error, "RepeatedCandidate")
+            continue
 
-        success, sql_error, exception_class = run_sql_safely(db_dir, db_id, sql_only)
+        sql_only, success, sql_error, exception_class = await validate(db_dir, db_id, candidate, tables)
+        tried[normalize_sql(candidate)] = tried[normalize_sql(sql_only)] = (sql_error, exception_class)
+        if exception_class == "SuspiciousResult":
+            last_executable = sql_only
         # print(f"After refiner SQL at attempt {attempts}:", sql_only)
-        attempts += 1
+        trace_log.record_attempt(f"refiner_{attempts}", sql_only, success, sql_error, exception_class)
     # print("After refiner SQL:", sql_only)
-    # Final SQL cleaning
+    if not success and last_executable is not None:
+        # A result that only looked wrong still beats no prediction at all.
+        print("Retries exhausted on suspicious results; keeping the last SQL that executed")
+        sql_only, success = last_executable, True
     # --- Logging ---
-    with open("agent_log3.txt", "a", encoding="utf-8") as log_file:
-        log_file.write("=====================\n")
-        log_file.write(f"Question: {question}\n db_id: {db_id}\n")
-        log_file.write(f"Selector: {selections}\n")
-        log_file.write(f"Final SQL (attempt {attempts}): {sql_only}\n")
-        if not success:
-            log_file.write(f"Final Error: {sql_error}\n")
+    trace_log.annotate(selection=selections, refiner_attempts=attempts, final_sql=sql_only, success=success)
 
     if success:
         return sql_only
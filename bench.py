@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+BENCH_DIR = "bench_results"
+# Reported in this order; agents only appear when they were called.
+STAGES = ("schema_load", "Selector", "Decomposer", "DecomposerSampler", "validation", "Refiner", "persistence")
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, so small runs report latencies that actually happened."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+def stage_stats(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "p99": round(percentile(values, 99), 6),
+        "mean": round(sum(values) / len(values), 6),
+        "total": round(sum(values), 6),
+    }
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def run(args, main_argv: list[str]) -> dict:
+    # agents reads MODEL_CONFIG at import time, so set it before main (and agents) is imported.
+    os.environ["MODEL_CONFIG"] = args.model_config
+    import main
+    from metrics import run_metrics
+
+    data = main.load_dataset(args.data)[args.offset:args.offset + args.questions]
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        # Predictions, results and traces of the run go to a scratch directory, not the real ones.
+        main.DATA_FILE = os.path.join(tmp, "subset.json")
+        main.JOURNAL_FILE = os.path.join(tmp, "predictions.jsonl")
+        main.OUTPUT_FILE = os.path.join(tmp, "predictions.json")
+        main.RESULTS_DIR = os.path.join(tmp, "results")
+        os.makedirs(main.RESULTS_DIR)
+        with open(main.DATA_FILE, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        run_args = main.parse_args([
+            "--workers", str(args.workers),
+            "--metrics", os.path.join(tmp, "metrics.json"),
+            "--trace", os.path.join(tmp, "trace.jsonl"),
+            *(["--replay", "--cache", args.cache] if args.backend == "cache" else ["--no-cache"]),
+            *main_argv,
+        ])
+        started = time.perf_counter()
+        asyncio.run(main.process_all(run_args))
+        wall = time.perf_counter() - started
+        completed = len(main.read_journal(main.JOURNAL_FILE))
+
+    latencies = run_metrics.latencies()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "config": {
+            "backend": args.backend,
+            "model_config": args.model_config,
+            "questions": len(data),
+            "offset": args.offset,
+            "workers": args.workers,
+            "main_args": main_argv,
+        },
+        "completed": completed,
+        "wall_seconds": round(wall, 3),
+        "questions_per_sec": round(completed / wall, 3) if wall else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: stage_stats(latencies[stage]) for stage in STAGES if latencies.get(stage)},
+    }
+
+def compare(result: dict, baseline: dict):
+    print(f"{'':<20}{'baseline':>12}{'this run':>12}{'change':>10}")
+    rows = [("questions/sec", baseline["questions_per_sec"], result["questions_per_sec"]),
+            ("peak RSS (MB)", baseline["peak_rss_mb"], result["peak_rss_mb"])]
+    for stage, stats in result["stages"].items():
+        if stage in baseline["stages"]:
+            rows.append((f"{stage} p95 (s)", baseline["stages"][stage]["p95"], stats["p95"]))
+    for name, before, after in rows:
+        change = f"{100.0 * (after - before) / before:+.1f}%" if before else "n/a"
+        print(f"{name:<20}{before:>12.4f}{after:>12.4f}{change:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline on a fixed subset without a live model. "
+                    "Unknown options are passed on to main.py (e.g. --samples 3 --validate prepare).")
+    parser.add_argument("--backend", choices=("mock", "cache"), default="mock",
+                        help="mock: the model config's MockModelClient; cache: replay the LLM response cache.")
+    parser.add_argument("--model-config", default="bench_model_config.json",
+                        help="Model config to load; for --backend mock it should use MockModelClient.")
+    parser.add_argument("--cache", default="llm_cache.sqlite", help="Response cache replayed by --backend cache.")
+    parser.add_argument("--data", default="data/mini_dev_sqlite.json")
+    parser.add_argument("--questions", type=int, default=50, help="Size of the subset (default: first 50).")
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--out", default=None, help=f"Result file (default: {BENCH_DIR}/bench_<time>.json).")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare against.")
+    args, main_argv = parser.parse_known_args()
+
+    result = run(args, main_argv)
+    out = args.out or os.path.join(BENCH_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"\n{result['completed']} questions in {result['wall_seconds']}s "
+          f"({result['questions_per_sec']} q/s), peak RSS {result['peak_rss_mb']} MB")
+    print(f"{'stage':<20}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<20}{stats['count']:>6}{stats['p50']:>10.4f}{stats['p95']:>10.4f}{stats['p99']:>10.4f}")
+    print(f"Saved to {out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+MMAP_SIZE = 256 * 1024 * 1024
+MAX_IDLE_PER_DB = 8
+
+class ConnectionPool:
+    """
+    Read-only SQLite connections reused across candidate queries.
+    Databases are opened with mode=ro&immutable=1 (no locking or change detection), query_only
+    and a large mmap window. A connection is only ever used by the thread that checked it out,
+    so the pool can be shared by the event loop's worker threads.
+    """
+
+    def __init__(self, max_idle_per_db: int = MAX_IDLE_PER_DB, mmap_size: int = MMAP_SIZE,
+                 shared_cache: bool = True):
+        self.max_idle_per_db = max_idle_per_db
+        self.mmap_size = mmap_size
+        self.shared_cache = shared_cache
+        self._idle: dict[str, list[sqlite3.Connection]] = {}
+        self._lock = threading.Lock()
+
+    def _open(self, db_path: str) -> sqlite3.Connection:
+        uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro&immutable=1"
+        if self.shared_cache:
+            uri += "&cache=shared"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON;")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        return conn
+
+    @contextmanager
+    def connection(self, db_path: str):
+        with self._lock:
+            idle = self._idle.setdefault(db_path, [])
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = self._open(db_path)
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                idle = self._idle[db_path]
+                if len(idle) < self.max_idle_per_db:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+default_pool = ConnectionPool()
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from prediction_journal import read_journal
+from sql_validator import execute_with_limits, result_fingerprint, QueryTimeoutError, FINGERPRINT_VERSION
+from db_pool import default_pool
+
+DATA_DIR = "data"
+DATA_FILE = f"{DATA_DIR}/mini_dev_sqlite.json"
+DB_DIR = f"{DATA_DIR}/dev_databases"
+JOURNAL_FILE = "predictions.jsonl"
+GOLD_CACHE_FILE = f"{DATA_DIR}/gold_results.json"
+EVAL_TIMEOUT = 30.0
+DIFFICULTIES = ("simple", "moderate", "challenging")
+
+def execute_query(db_path: str, sql: str, timeout: float) -> dict:
+    """Run one query in a worker process and return fingerprints of its result, not the rows."""
+    try:
+        with default_pool.connection(db_path) as conn:
+            rows = execute_with_limits(conn, sql, timeout, sys.maxsize)
+        return {"status": "ok", "set": result_fingerprint(rows), "multiset": result_fingerprint(rows, multiset=True)}
+    except QueryTimeoutError:
+        return {"status": "timeout"}
+    except Exception as e:
+        return {"status": "error", "error": f"{e.__class__.__name__}: {e}"}
+
+def load_predictions(path: str) -> dict[int, str]:
+    """Read predicted SQL by dataset index from the journal or a BIRD-format predictions.json."""
+    if path.endswith(".jsonl"):
+        entries = read_journal(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = {int(k): v for k, v in json.load(f).items()}
+    return {idx: entry.split("\t----- bird -----\t")[0] for idx, entry in entries.items()}
+
+def gold_key(db_id: str, sql: str) -> str:
+    return hashlib.sha256(f"{db_id}\n{sql}".encode("utf-8")).hexdigest()
+
+def load_gold_cache(path: str) -> dict:
+    """Cached gold fingerprints, or none if they were computed by another fingerprint version."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == FINGERPRINT_VERSION:
+            return cache["results"]
+    return {}
+
+def save_gold_cache(cache: dict, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": FINGERPRINT_VERSION, "results": cache}, f)
+    os.replace(tmp_path, path)
+
+def evaluate(data: list[dict], predictions: dict[int, str], db_dir: str, workers: int, timeout: float,
+             gold_cache_path: str, multiset: bool = False) -> list[dict]:
+    """
+    Execute predicted and gold SQL concurrently across a process pool and compare result sets.
+    Gold results are cached on disk by (db_id, gold SQL), so later runs only execute predictions.
+    """
+    gold_cache = load_gold_cache(gold_cache_path)
+    compare_on = "multiset" if multiset else "set"
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for idx in sorted(predictions):
+            example = data[idx]
+            db_path = os.path.join(db_dir, example["db_id"], f"{example['db_id']}.sqlite")
+            key = gold_key(example["db_id"], example["SQL"])
+            gold_future = None
+            if key not in gold_cache:
+                gold_future = pool.submit(execute_query, db_path, example["SQL"], timeout)
+            pending[idx] = (key, gold_future, pool.submit(execute_query, db_path, predictions[idx], timeout))
+
+        results = []
+        for idx, (key, gold_future, pred_future) in pending.items():
+            if gold_future is not None:
+                gold = gold_future.result()
+                if gold["status"] == "ok":
+                    gold_cache[key] = gold
+            else:
+                gold = gold_cache[key]
+            pred = pred_future.result()
+            correct = gold["status"] == "ok" and pred["status"] == "ok" and pred[compare_on] == gold[compare_on]
+            results.append({
+                "idx": idx,
+                "db_id": data[idx]["db_id"],
+                "difficulty": data[idx].get("difficulty", "unknown"),
+                "correct": correct,
+                "sql": predictions[idx],
+                "status": pred["status"],
+                "error": pred.get("error", ""),
+            })
+    save_gold_cache(gold_cache, gold_cache_path)
+    return results
+
+def report(results: list[dict]) -> dict:
+    levels = [d for d in DIFFICULTIES if any(r["difficulty"] == d for r in results)]
+    levels += sorted({r["difficulty"] for r in results} - set(DIFFICULTIES))
+    scores = {}
+    for level in levels + ["total"]:
+        group = [r for r in results if level == "total" or r["difficulty"] == level]
+        scores[level] = {
+            "count": len(group),
+            "correct": sum(r["correct"] for r in group),
+            "ex": 100.0 * sum(r["correct"] for r in group) / len(group) if group else 0.0,
+        }
+    print(f"{'':<14}" + "".join(f"{level:>14}" for level in scores))
+    print(f"{'count':<14}" + "".join(f"{s['count']:>14}" for s in scores.values()))
+    print(f"{'EX':<14}" + "".join(f"{s['ex']:>14.2f}" for s in scores.values()))
+    return scores
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execution accuracy (EX) of predictions against the BIRD gold SQL.")
+    parser.add_argument("--predictions", default=JOURNAL_FILE,
+                        help="Prediction journal (.jsonl) or BIRD-format predictions.json.")
+    parser.add_argument("--data", default=DATA_FILE)
+    parser.add_argument("--db-dir", default=DB_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--timeout", type=float, default=EVAL_TIMEOUT, help="Per-query time limit in seconds.")
+    parser.add_argument("--gold-cache", default=GOLD_CACHE_FILE)
+    parser.add_argument("--multiset", action="store_true",
+                        help="Also require duplicate rows to match (BIRD compares sets).")
+    parser.add_argument("--output", default=None, help="Write per-question results and scores to this JSON file.")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    results = evaluate(data, load_predictions(args.predictions), args.db_dir, args.workers, args.timeout,
+                       args.gold_cache, multiset=args.multiset)
+    scores = report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"scores": scores, "results": results}, f, indent=2)
@@ -0,0 +1,93 @@
+import os
+import glob
+import json
+from collections import Counter
+from schema_retriever import tokenize, bm25_scores
+from sql_validator import run_sql_safely
+
+EVALED_DIR = "evaled_results"
+MAX_EXAMPLES = 2000
+MAX_SQL_CHARS = 1500
+# Multiplier for examples from the question's own database.
+SAME_DB_BOOST = 1.5
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+def read_examples(data: list[dict], evaled_dir: str = EVALED_DIR) -> list[dict]:
+    """
+    Question -> SQL pairs that evaluate.py scored as correct against the gold SQL: every
+    `evaluate.py --output` file under evaled_dir (newest first), matched to its question by
+    dataset index. Predictions that were never evaluated are not used. The first SQL found for
+    a question is kept.
+    """
+    examples = {}
+    paths = glob.glob(os.path.join(evaled_dir, "**", "*.json"), recursive=True)
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        with open(path, "r", encoding="utf-8") as f:
+            evaluation = json.load(f)
+        # Prediction files sit in the same directory; only evaluation outputs have "results".
+        if not isinstance(evaluation, dict) or not isinstance(evaluation.get("results"), list):
+            continue
+        for result in evaluation["results"]:
+            idx = result.get("idx")
+            if not (result.get("correct") and result.get("sql")) or not isinstance(idx, int) or idx >= len(data):
+                continue
+            example = data[idx]
+            key = normalize_question(example["question"])
+            if result.get("db_id") == example["db_id"] and key not in examples:
+                examples[key] = {"question": example["question"], "evidence": example.get("evidence", ""),
+                                 "db_id": example["db_id"], "sql": result["sql"].strip()}
+    return list(examples.values())
+
+class ExampleStore:
+    """
+    BM25 index over solved questions (question + evidence), used to pick the few-shot examples
+    most similar to a new question. Only SQL that still compiles against its database and is at
+    most max_sql_chars long is kept, up to max_examples entries.
+    """
+
+    def __init__(self, examples: list[dict], db_dir: str | None = None,
+                 max_examples: int = MAX_EXAMPLES, max_sql_chars: int = MAX_SQL_CHARS):
+        kept = []
+        for example in examples:
+            if len(kept) >= max_examples:
+                break
+            if len(example["sql"]) > max_sql_chars:
+                continue
+            if db_dir is not None:
+                ok, _, _ = run_sql_safely(db_dir, example["db_id"], example["sql"], mode="prepare")
+                if not ok:
+                    continue
+            kept.append(example)
+        self.examples = kept
+        self.docs = [Counter(tokenize(f"{e['question']} {e['evidence']}")) for e in kept]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.df = Counter(term for doc in self.docs for term in doc)
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    def search(self, question: str, evidence: str = "", db_id: str | None = None, top_k: int = 3) -> list[dict]:
+        """Top-k similar examples. The question itself is never returned, so answers cannot leak."""
+        own = normalize_question(question)
+        scored = []
+        for i, score in enumerate(bm25_scores(tokenize(f"{question} {evidence}"), self.docs, self.lengths, self.df)):
+            if score <= 0 or normalize_question(self.examples[i]["question"]) == own:
+                continue
+            if db_id is not None and self.examples[i]["db_id"] == db_id:
+                score *= SAME_DB_BOOST
+            scored.append((score, i))
+        scored.sort(reverse=True)
+        return [self.examples[i] for _, i in scored[:top_k]]
+
+def render_examples(examples: list[dict]) -> str:
+    # Plain labels rather than [Question]/[Evidence], so examples are not mistaken for the task itself.
+    parts = []
+    for example in examples:
+        part = f"Question ({example['db_id']}): {example['question']}\n"
+        if example["evidence"]:
+            part += f"Evidence: {example['evidence']}\n"
+        part += f"SQL:\n```sql\n{example['sql']}\n```"
+        parts.append(part)
+    return "\n\n".join(parts)
@@ -0,0 +1,86 @@
+import os
+import json
+import threading
+from collections import deque
+
+class ForeignKeyGraph:
+    """Join graph of one database: tables are nodes, each foreign key is an undirected edge."""
+
+    def __init__(self, edges: list[tuple[str, str, str, str]]):
+        self.edges = [tuple(edge) for edge in edges]
+        self.adjacency: dict[str, list[tuple[str, str, str, str]]] = {}
+        for t1, c1, t2, c2 in edges:
+            self.adjacency.setdefault(t1.lower(), []).append((t1, c1, t2, c2))
+            self.adjacency.setdefault(t2.lower(), []).append((t2, c2, t1, c1))
+
+    def render(self) -> str:
+        return "\n".join(f"{t1}.{c1} = {t2}.{c2}" for t1, c1, t2, c2 in self.edges)
+
+    def join_path(self, source: str, target: str) -> list[tuple[str, str, str, str]] | None:
+        """Shortest chain of (table, column, next_table, next_column) joins from source to target."""
+        source, target = source.lower(), target.lower()
+        if source == target:
+            return []
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            table = queue.popleft()
+            for edge in self.adjacency.get(table, []):
+                nxt = edge[2].lower()
+                if nxt in previous:
+                    continue
+                previous[nxt] = (table, edge)
+                if nxt == target:
+                    path = []
+                    while previous[nxt] is not None:
+                        nxt, edge = previous[nxt]
+                        path.append(edge)
+                    return path[::-1]
+                queue.append(nxt)
+        return None
+
+    def connecting_tables(self, tables) -> set[str]:
+        """Lower-cased tables needed to join all of `tables`, including intermediate ones."""
+        tables = [t.lower() for t in tables]
+        needed = set(tables)
+        for other in tables[1:]:
+            path = self.join_path(tables[0], other)
+            for t1, _, t2, _ in path or []:
+                needed.update((t1.lower(), t2.lower()))
+        return needed
+
+def _edges_from_entry(entry) -> list[tuple[str, str, str, str]]:
+    # Spider/BIRD layout: foreign keys are pairs of indices into column_names_original.
+    if "column_names_original" in entry:
+        tables = entry["table_names_original"]
+        columns = entry["column_names_original"]
+        edges = []
+        for src, dst in entry.get("foreign_keys", []):
+            (t1, c1), (t2, c2) = columns[src], columns[dst]
+            edges.append((tables[t1], c1, tables[t2], c2))
+        return edges
+    return [tuple(fk) for fk in entry.get("foreign_keys", [])]
+
+def build_index(fk_file_path: str) -> dict[str, ForeignKeyGraph]:
+    with open(fk_file_path, "r", encoding="utf-8") as f:
+        fk_data = json.load(f)
+    if isinstance(fk_data, list):
+        fk_data = {entry["db_id"]: entry for entry in fk_data}
+    return {db_id: ForeignKeyGraph(_edges_from_entry(entry)) for db_id, entry in fk_data.items()}
+
+_indexes: dict[str, dict[str, ForeignKeyGraph]] = {}
+_lock = threading.Lock()
+
+def get_graph(data_dir: str, db_id: str) -> ForeignKeyGraph:
+    """The foreign-key graph of db_id; dev_tables.json is read once per process."""
+    fk_file_path = os.path.join(data_dir, "dev_tables.json")
+    with _lock:
+        index = _indexes.get(fk_file_path)
+        if index is None:
+            if os.path.exists(fk_file_path):
+                index = build_index(fk_file_path)
+            else:
+                print(f"No foreign key file at {fk_file_path}; prompts will have no [Foreign keys]")
+                index = {}
+            _indexes[fk_file_path] = index
+    return index.get(db_id) or ForeignKeyGraph([])
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Hits only record their time in memory; it is written out in batches of this many keys.
+TOUCH_BATCH = 100
+
+class CacheMiss(LookupError):
+    pass
+
+class LLMCache:
+    """
+    On-disk cache of agent replies keyed by a hash of (agent name, system message, model, messages).
+    In replay mode the database is opened read-only and a miss raises CacheMiss instead of
+    falling through to the model, so a run can never spend quota.
+    """
+
+    def __init__(self, path: str, max_entries: int | None = None, max_age_days: float | None = None,
+                 replay: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> last hit time, not yet written to the database.
+        self._touched: dict[str, float] = {}
+        if replay:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Replay needs an existing cache file: {path}")
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode = WAL;")
+            # In WAL mode NORMAL stays consistent after a crash; it only skips the fsync per commit.
+            self._conn.execute("PRAGMA synchronous = NORMAL;")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    agent TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);")
+            self._conn.commit()
+            self.evict()
+
+    @staticmethod
+    def make_key(agent_name: str, system_message: str, model: str, messages: list[dict], sample: int = 0) -> str:
+        # sample tells apart independent draws of the same prompt; 0 keeps the original key.
+        parts = [agent_name, system_message, model, messages] + ([sample] if sample else [])
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age and time.time() - row[1] > self.max_age:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.replay:
+                self._touched[key] = time.time()
+                if len(self._touched) >= TOUCH_BATCH:
+                    self._flush_touched()
+                    self._conn.commit()
+            return row[0]
+
+    def _flush_touched(self):
+        # Called with the lock held; the caller commits.
+        self._conn.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                               [(used, key) for key, used in self._touched.items()])
+        self._touched.clear()
+
+    def put(self, key: str, agent_name: str, model: str, response: str):
+        if self.replay:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, agent, model, response, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent_name, model, response, now, now),
+            )
+            self._flush_touched()
+            self._conn.commit()
+
+    def evict(self):
+        """Drop entries older than max_age, then the least recently used ones beyond max_entries."""
+        if self.replay:
+            return
+        with self._lock:
+            self._flush_touched()
+            if self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        if not self.replay:
+            self.evict()
+        with self._lock:
+            self._conn.close()
@@ -1,14 +1,34 @@
 import json
+import time
 import asyncio
+import argparse
 import os
-from schema_extractor import get_schema
-from agents import solve
+from concurrent.futures import ThreadPoolExecutor
+from schema_extractor import load_catalog, save_catalog, ensure_catalog, render_schema
+from agents import solve, configure_cache, configure_sampling, configure_budget, configure_prefix_cache, configure_examples
+from metrics import run_metrics, current_question
+import trace_log
+from llm_cache import LLMCache
+from sql_validator import configure_limits, run_sql_safely
+from foreign_keys import ForeignKeyGraph
+from schema_retriever import SchemaRetriever
+from value_index import open_value_index, render_value_hints
+from example_store import ExampleStore, read_examples, render_examples
+from question_cache import QuestionCache
+from prediction_journal import PredictionJournal, finalize_predictions, read_journal
+from scheduler import DbAffinityQueue, FileOrderQueue
+from prefix_cache import PrefixCache, MIN_PREFIX_TOKENS
 
 # Add your data paths here - after downloading the dataset
 DATA_DIR = "data"
 DATA_FILE = f"{DATA_DIR}/mini_dev_sqlite.json"
 DB_DIR = f"{DATA_DIR}/dev_databases"
+CATALOG_FILE = f"{DATA_DIR}/schema_catalog.json"
 OUTPUT_FILE = "predictions.json"
+JOURNAL_FILE = "predictions.jsonl"
+CACHE_FILE = "llm_cache.sqlite"
+METRICS_FILE = "metrics.json"
+TRACE_FILE = "logs/agent_trace.jsonl"
 RESULTS_DIR = "results"
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
@@ -26,81 +46,284 @@ def save_individual_result(idx, db_id, result_data):
     with open(file_path, "w", encoding="utf-8") as f:
         json.dump(result_data, f, indent=2)
 
-def append_to_predictions(output_line):
-    predictions = {}
-
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
-            predictions = json.load(f)
-
-    # Ensure keys are string indices
-    next_key = str(len(predictions))
-    print(f"Appending to predictions with key: {next_key} type: {type(next_key)}")
-    predictions[next_key] = output_line
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(predictions, f, indent=2)
-
-async def process_all():
-    data = load_dataset(DATA_FILE) #[465:]
-    predictions = []
-    table_names = {}
-    retriever_cache = {}
-
-
-    for idx, example in enumerate(data, start=1):
-        db_id = example["db_id"]
-        question = example["question"]
-        evidence = example.get("evidence", "")
-
-        print(f"Processing {db_id}...")
-        print(idx,"index")
-        if db_id not in retriever_cache:
-            try:
-                schema = get_schema(os.path.join(DB_DIR, db_id), encoding="utf-8-sig")
-            except Exception as e:
-                print("Exception occured: changed encoding to cp1252")
-                print(e)
-                schema = get_schema(os.path.join(DB_DIR, db_id), encoding="cp1252")
-            retriever_cache[db_id] = schema
-        
-        schema = retriever_cache[db_id]
-
-        # retriever = retriever_cache[db_id]["retriever"]
-        # table_names[db_id] = retriever_cache[db_id]["table_names"]
-        
-        # retrieved_entries = retriever.retrieve(question, top_k=10)
-        # schema_text = retriever.build_schema_text(retrieved_entries)
-        # allowed_tables = ", ".join(table_names[db_id])
-        # schema = f"Allowed Tables: {allowed_tables}\n\n{schema_text}"
-
-        if schema == "":
-            raise ValueError(f"Schema is empty for {db_id}")
-        print(f"[{idx}/{len(data)}] {db_id}: {question[:80]}")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate BIRD predictions with the Selector/Decomposer/Refiner agents.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of questions solved concurrently (default: 1).")
+    parser.add_argument("--schedule", choices=["affinity", "file"], default="affinity",
+                        help="affinity: each worker stays on one database while it has questions; file: dataset order.")
+    parser.add_argument("--prefix-min-tokens", type=int, default=MIN_PREFIX_TOKENS,
+                        help="Smallest shared prompt prefix counted as provider-cacheable in the metrics.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip questions already recorded in the journal or results/ and continue the run.")
+    parser.add_argument("--catalog", default=CATALOG_FILE,
+                        help="Compiled schema catalog; missing or stale databases are compiled into it.")
+    parser.add_argument("--prune-top-k", type=int, default=0,
+                        help="Send only the N columns most relevant to the question (plus FK join paths) "
+                             "instead of the full schema; 0 keeps the full schema.")
+    parser.add_argument("--embedding-model", default=None,
+                        help="sentence-transformers model for schema pruning and the question cache (e.g. all-MiniLM-L6-v2); "
+                             "BM25 / character n-grams if unset.")
+    parser.add_argument("--value-index", action="store_true",
+                        help="Ground literals with values from data/value_index/ (built on first use).")
+    parser.add_argument("--few-shot", type=int, default=0,
+                        help="Replace the static Decomposer examples with the N most similar questions that "
+                             "evaluate.py outputs in evaled_results/ mark correct (0 keeps the static examples).")
+    parser.add_argument("--few-shot-max", type=int, default=2000,
+                        help="Most solved questions kept in the few-shot index.")
+    parser.add_argument("--question-cache", type=float, default=None, metavar="THRESHOLD",
+                        help="Reuse the validated SQL of an earlier question on the same database and evidence "
+                             "whose text is at least THRESHOLD similar (e.g. 0.92); off by default.")
+    parser.add_argument("--question-cache-size", type=int, default=10000,
+                        help="Most questions kept in the question cache (least recently used are evicted).")
+    parser.add_argument("--question-cache-ttl", type=float, default=None,
+                        help="Seconds after which a question cache entry expires.")
+    parser.add_argument("--samples", type=int, default=1,
+                        help="Decomposer candidates per question; >1 votes on their execution results.")
+    parser.add_argument("--quorum", type=int, default=None,
+                        help="Stop sampling once this many candidates agree (default: a majority of --samples).")
+    parser.add_argument("--prompt-budget", type=int, default=None,
+                        help="Truncate the schema of any prompt estimated above this many tokens.")
+    parser.add_argument("--metrics", default=METRICS_FILE,
+                        help=f"Where to write per-agent and per-question token/latency totals (default: {METRICS_FILE}).")
+    parser.add_argument("--trace", default=TRACE_FILE,
+                        help=f"JSONL file receiving one structured trace record per question (default: {TRACE_FILE}).")
+    parser.add_argument("--sql-timeout", type=float, default=30.0,
+                        help="Wall-clock budget in seconds for validating one candidate SQL.")
+    parser.add_argument("--max-rows", type=int, default=10000,
+                        help="Stop fetching a candidate's result after this many rows.")
+    parser.add_argument("--validate", choices=["execute", "prepare"], default="execute",
+                        help="'prepare' only compiles candidates with EXPLAIN; 'execute' also runs those that compile.")
+    parser.add_argument("--suspicious", default="",
+                        help="Comma-separated result checks that send an executable query to the Refiner: "
+                             "empty (no rows), null (only NULLs), oversize (too many rows).")
+    parser.add_argument("--oversize-rows", type=int, default=None,
+                        help="Row count at which the 'oversize' check fires (default: --max-rows).")
+    parser.add_argument("--cache", default=CACHE_FILE,
+                        help=f"SQLite file caching agent replies (default: {CACHE_FILE}).")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model.")
+    parser.add_argument("--replay", action="store_true",
+                        help="Serve replies only from the cache; fail instead of calling the model.")
+    parser.add_argument("--cache-max-entries", type=int, default=None,
+                        help="Evict least recently used replies beyond this many.")
+    parser.add_argument("--cache-max-age-days", type=float, default=None,
+                        help="Ignore and evict replies older than this.")
+    args = parser.parse_args(argv)
+    if args.replay and args.no_cache:
+        parser.error("--replay serves replies only from the cache and cannot be combined with --no-cache")
+    if args.oversize_rows is not None and args.oversize_rows > args.max_rows:
+        parser.error("--oversize-rows cannot exceed --max-rows: results are cut off at --max-rows rows")
+    return args
 
-        try:
-            sql = solve(DB_DIR, DATA_DIR, question, schema, db_id, evidence)
-        except Exception as e:
-            print("ERROR:", e)
-            raise e
+def load_completed(data):
+    """
+    Return {dataset index: sql_entry} for questions finished by an earlier run.
+    Results files are only trusted when their question matches the dataset entry at that index.
+    """
+    completed = read_journal(JOURNAL_FILE)
+    for filename in os.listdir(RESULTS_DIR):
+        stem, ext = os.path.splitext(filename)
+        number, _, db_id = stem.partition("_")
+        if ext != ".json" or not number.isdigit():
+            continue
+        key = int(number) - 1
+        if key in completed or not 0 <= key < len(data):
+            continue
+        with open(os.path.join(RESULTS_DIR, filename), "r", encoding="utf-8") as f:
+            result = json.load(f)
+        example = data[key]
+        if example["db_id"] == db_id and example["question"] == result.get("question"):
+            completed[key] = result["sql"]
+    return completed
+
+def load_schemas(data, catalog_path):
+    catalog = load_catalog(catalog_path)
+    db_ids = list(dict.fromkeys(example["db_id"] for example in data))
+
+    schemas = {}
+    changed = False
+    for db_id in db_ids:
+        with run_metrics.stage("schema_load"):
+            changed |= ensure_catalog(catalog, DB_DIR, [db_id], DATA_DIR)
+            entry = catalog["databases"][db_id]
+            if entry["schema"] == "":
+                raise ValueError(f"Schema is empty for {db_id}")
+            schemas[db_id] = dict(entry)
+    if changed:
+        save_catalog(catalog, catalog_path)
+    return schemas
+
+def prompt_context(example, db_entry, args, example_store=None):
+    """Schema (and the tables it renders), matched values and few-shot examples for one question's prompts."""
+    question = example["question"]
+    evidence = example.get("evidence", "")
+    schema, tables = db_entry["schema"], db_entry["tables"]
+    if "retriever" in db_entry:
+        tables = db_entry["retriever"].prune(f"{question} {evidence}", top_k=args.prune_top_k)
+        schema = render_schema(tables)
+    value_hints = ""
+    if "values" in db_entry:
+        text = f"{question} {evidence}"
+        value_hints = render_value_hints(db_entry["values"].lookup(text), db_entry["values"].ranges(text))
+    examples = ""
+    if example_store is not None:
+        examples = render_examples(example_store.search(question, evidence, example["db_id"], top_k=args.few_shot))
+    return schema, tables, value_hints, examples
+
+async def reuse_cached_sql(question_cache, question, evidence, db_id):
+    """SQL of a cached paraphrase of this question, if it still validates; None otherwise."""
+    # Encoding the question may run a sentence-transformers model; keep it off the event loop.
+    hit = await asyncio.to_thread(question_cache.lookup, question, evidence, db_id)
+    if hit is None:
+        return None
+    sql, similarity, key = hit
+    success, sql_error, _ = await asyncio.to_thread(run_sql_safely, DB_DIR, db_id, sql)
+    if not success:
+        question_cache.invalidate(key)
+        print(f"Cached SQL for a similar question no longer validates: {sql_error}")
+        return None
+    print(f"Question cache hit (similarity {similarity:.3f})")
+    trace_log.annotate(question_cache_similarity=round(similarity, 4), final_sql=sql, success=True)
+    return sql
 
-        # Final SQL cleaning
-        sql = sql.replace(f"{db_id}.", "").strip()
+async def process_example(idx, total, example, db_entry, journal, args, example_store=None, question_cache=None):
+    db_id = example["db_id"]
+    question = example["question"]
+    evidence = example.get("evidence", "")
 
-        sql_entry = f"{sql}\t----- bird -----\t{db_id}"
+    current_question.set(idx - 1)
+    trace = trace_log.new_trace(idx - 1, db_id, question)
+    trace_log.current_trace.set(trace)
+    started = time.perf_counter()
+    print(f"[{idx}/{total}] {db_id}: {question[:80]}")
+    try:
+        sql = None
+        # A cache hit skips prompt building; its result file records the full schema.
+        schema = db_entry["schema"]
+        if question_cache is not None:
+            sql = await reuse_cached_sql(question_cache, question, evidence, db_id)
+        if sql is None:
+            # Pruning may encode the question with the embedding model; keep it off the event loop.
+            schema, prompt_tables, value_hints, examples = await asyncio.to_thread(
+                prompt_context, example, db_entry, args, example_store)
+            sql = await solve(DB_DIR, DATA_DIR, question, schema, db_id, evidence, tables=db_entry["tables"],
+                              value_hints=value_hints, foreign_keys=db_entry["foreign_keys"], examples=examples,
+                              prompt_tables=prompt_tables)
+    except Exception as e:
+        print("ERROR:", e)
+        trace["exception"] = f"{e.__class__.__name__}: {e}"
+        raise e
+    finally:
+        trace["duration"] = round(time.perf_counter() - started, 4)
+        trace_log.emit(trace)
+
+    # Final SQL cleaning
+    sql = sql.replace(f"{db_id}.", "").strip()
+    if question_cache is not None:
+        await asyncio.to_thread(question_cache.put, question, evidence, db_id, sql)
+
+    sql_entry = f"{sql}\t----- bird -----\t{db_id}"
+    with run_metrics.stage("persistence"):
         save_individual_result(idx, db_id, {
             "question": question,
             "schema": schema,
             "evidence": evidence,
             "sql": sql_entry
         })
-        predictions.append(sql_entry)
-        append_to_predictions(sql_entry)
-        # if idx == 2:
-        #     break
+        # Journal keys are the 0-based dataset position used by the BIRD predictions file.
+        journal.record(idx - 1, db_id, sql_entry)
+
+async def process_all(args):
+    data = load_dataset(DATA_FILE)
+    completed = load_completed(data) if args.resume else {}
+    pending = [(idx, example) for idx, example in enumerate(data, start=1) if idx - 1 not in completed]
+    if args.resume:
+        print(f"Resuming: {len(completed)} questions already done, {len(pending)} left")
+
+    # Schemas are loaded up front so concurrent workers never parse the same database twice.
+    retriever_cache = load_schemas([example for _, example in pending], args.catalog)
+    if args.prune_top_k > 0:
+        for db_id, entry in retriever_cache.items():
+            entry["retriever"] = SchemaRetriever(db_id, entry["tables"], ForeignKeyGraph(entry["foreign_keys"]),
+                                                 model_name=args.embedding_model)
+    if args.value_index:
+        for db_id, entry in retriever_cache.items():
+            entry["values"] = open_value_index(DB_DIR, db_id)
+
+    example_store = None
+    if args.few_shot > 0:
+        example_store = ExampleStore(read_examples(data), db_dir=DB_DIR, max_examples=args.few_shot_max)
+        print(f"Few-shot store: {len(example_store)} solved questions")
+        if len(example_store) == 0:
+            print("No evaluate.py outputs under evaled_results/ mark any question correct; "
+                  "--few-shot is ignored and the static prompt examples are kept")
+            example_store = None
+    configure_examples(example_store is not None)
+    question_cache = None
+    if args.question_cache is not None:
+        question_cache = QuestionCache(threshold=args.question_cache, max_entries=args.question_cache_size,
+                                       ttl=args.question_cache_ttl, model_name=args.embedding_model)
+
+    # The default executor runs the blocking model and SQLite calls; size it to the worker count.
+    workers = max(1, args.workers)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers * 2 + 4))
+    configure_limits(timeout=args.sql_timeout, max_rows=args.max_rows, mode=args.validate,
+                     suspicious=tuple(rule for rule in args.suspicious.split(",") if rule),
+                     oversize_rows=args.oversize_rows)
+    configure_sampling(args.samples, args.quorum)
+    configure_budget(args.prompt_budget)
+    prefix_cache = PrefixCache(min_tokens=args.prefix_min_tokens)
+    configure_prefix_cache(prefix_cache)
+    tracer = trace_log.TraceWriter(args.trace)
+    trace_log.configure_tracer(tracer)
+
+    cache = None
+    if not args.no_cache:
+        cache = LLMCache(args.cache, max_entries=args.cache_max_entries,
+                         max_age_days=args.cache_max_age_days, replay=args.replay)
+    configure_cache(cache)
+
+    journal_entries = read_journal(JOURNAL_FILE) if args.resume else {}
+    with PredictionJournal(JOURNAL_FILE, fresh=not args.resume) as journal:
+        # Copy results recovered from results/ into the journal so finalize sees them too.
+        for key, sql_entry in sorted(completed.items()):
+            if key not in journal_entries:
+                journal.record(key, data[key]["db_id"], sql_entry)
+        queue = DbAffinityQueue(pending) if args.schedule == "affinity" else FileOrderQueue(pending)
+
+        async def worker():
+            db_id = None
+            while (item := queue.take(db_id)) is not None:
+                idx, example = item
+                db_id = example["db_id"]
+                await process_example(idx, len(data), example, retriever_cache[db_id], journal, args,
+                                      example_store, question_cache)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(min(workers, len(pending)))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Wait for the cancelled workers to unwind, so none emits a trace after the writer closes.
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Let the writer drain so the failing question's trace is on disk too.
+            tracer.close()
+
+    run_metrics.write(args.metrics, question_cache=question_cache.stats() if question_cache else None)
+    if question_cache is not None:
+        print("Question cache:", question_cache.stats())
+    print("Model usage:", run_metrics.summary()["total"])
+    print("Prompt prefix cache:", prefix_cache.stats())
+    if cache is not None:
+        print("LLM cache:", cache.stats())
+        cache.close()
+
+    # The journal is keyed by dataset index, so the final file comes out in the original order.
+    count = finalize_predictions(JOURNAL_FILE, OUTPUT_FILE)
+    print(f"Wrote {count} predictions to {OUTPUT_FILE}")
     print("cached dbs", len(retriever_cache))
     print("cached dbs keys", retriever_cache.keys())
-    print("table names", table_names)
 
 if __name__ == "__main__":
-    asyncio.run(process_all())
+    asyncio.run(process_all(parse_args()))
@@ -0,0 +1,97 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Dataset index of the question the current task is solving; set by main.process_example.
+current_question: ContextVar[int | None] = ContextVar("current_question", default=None)
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English and SQL; good enough for budgeting.
+    return len(text) // 4 + 1
+
+class RunMetrics:
+    """Per-call record of every agent request, summarised per agent and per question."""
+
+    def __init__(self):
+        self.calls: list[dict] = []
+        self.stages: list[dict] = []
+        self._lock = threading.Lock()
+
+    def record_call(self, agent: str, prompt_tokens: int, completion_tokens: int, latency: float,
+                    retries: int = 0, cached: bool = False, truncated: bool = False,
+                    cached_prompt_tokens: int = 0):
+        with self._lock:
+            self.calls.append({
+                "agent": agent,
+                "question": current_question.get(),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency": latency,
+                "retries": retries,
+                "cached": cached,
+                "truncated": truncated,
+                "cached_prompt_tokens": cached_prompt_tokens,
+            })
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a non-model stage (schema load, SQL validation, persistence) of the current question."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages.append({
+                    "stage": name,
+                    "question": current_question.get(),
+                    "latency": time.perf_counter() - started,
+                })
+
+    def latencies(self) -> dict[str, list[float]]:
+        """Latency samples per agent and per stage."""
+        with self._lock:
+            samples = [(c["agent"], c["latency"]) for c in self.calls] + [(s["stage"], s["latency"]) for s in self.stages]
+        grouped = {}
+        for name, latency in samples:
+            grouped.setdefault(name, []).append(latency)
+        return grouped
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        by_agent, by_question = {}, {}
+        for call in calls:
+            for key, groups in ((call["agent"], by_agent), (call["question"], by_question)):
+                totals = groups.setdefault(key, {
+                    "calls": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "latency": 0.0, "retries": 0, "truncated": 0, "cached_prompt_tokens": 0,
+                })
+                totals["calls"] += 1
+                totals["cache_hits"] += call["cached"]
+                totals["prompt_tokens"] += call["prompt_tokens"]
+                totals["completion_tokens"] += call["completion_tokens"]
+                totals["latency"] += call["latency"]
+                totals["retries"] += call["retries"]
+                totals["truncated"] += call["truncated"]
+                totals["cached_prompt_tokens"] += call["cached_prompt_tokens"]
+        total = {
+            "calls": len(calls),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            "cached_prompt_tokens": sum(c["cached_prompt_tokens"] for c in calls),
+            "latency": sum(c["latency"] for c in calls),
+        }
+        return {"total": total, "by_agent": by_agent, "by_question": by_question}
+
+    def write(self, path: str, **sections):
+        """Write the summary, plus any extra non-empty sections such as cache statistics."""
+        summary = self.summary()
+        summary.update({name: section for name, section in sections.items() if section is not None})
+        # JSON object keys must be strings.
+        summary["by_question"] = {str(k): v for k, v in summary["by_question"].items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+run_metrics = RunMetrics()
@@ -0,0 +1,218 @@
+import os
+import re
+import ast
+import glob
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from metrics import estimate_tokens
+
+# Read when a mock config entry does not list its own "mock_sources".
+DEFAULT_SOURCES = ("logs/agent_log*.txt", "results", "logs/agent_trace.jsonl")
+DEFAULT_SQL = "SELECT 1"
+# Speaker labels of the plain-text logs; the older logs come from the Planner/NL2SQL/Critic system.
+LOG_LABEL_RE = re.compile(r"^(Selector|Decomposer|Refiner|Planner|NL2SQL|Critic|Final SQL \(attempt \d+\)): ?(.*)$")
+AGENTCHAT_RE = re.compile(r"^source='(\w+)' .*? content=(.*) type='\w+'$")
+QUESTION_RE = re.compile(r"\[(?:Question|Query)\]\s*\n\s*(.+)")
+SQL_BLOCK_RE = re.compile(r"```sql\s*(.*?)```", re.S)
+
+def _sql_of(reply: str) -> str | None:
+    blocks = SQL_BLOCK_RE.findall(reply)
+    return blocks[-1].strip() if blocks else None
+
+def _add(recordings: dict, question: str, replies: dict, sql: str | None = None):
+    """Later records of a question replace the agents' replies they cover."""
+    entry = recordings.setdefault(question.strip(), {"replies": {}, "sql": None})
+    entry["replies"].update({agent: list(texts) for agent, texts in replies.items() if texts})
+    if sql:
+        entry["sql"] = sql
+
+def read_text_log(path: str, recordings: dict):
+    """Parse logs/agent_log*.txt, both the '=====' block format and autogen_agentchat message reprs."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+
+    question, replies, sql = None, {}, None
+    label, buffer = None, []
+
+    def close_section():
+        nonlocal sql
+        if label is None:
+            return
+        text = "\n".join(buffer).strip()
+        if label.startswith("Final SQL"):
+            sql = text
+        else:
+            replies.setdefault(label, []).append(text)
+            sql = _sql_of(text) or sql
+
+    def close_block():
+        nonlocal question, replies, sql, label, buffer
+        close_section()
+        if question:
+            _add(recordings, question, replies, sql)
+        question, replies, sql, label, buffer = None, {}, None, None, []
+
+    for line in lines:
+        m = AGENTCHAT_RE.match(line)
+        if m:
+            try:
+                content = ast.literal_eval(m.group(2))
+            except (ValueError, SyntaxError):
+                continue
+            if m.group(1) == "user" and content.startswith("Question: "):
+                close_block()
+                question = content.splitlines()[0][len("Question: "):]
+            elif question:
+                replies.setdefault(m.group(1), []).append(content)
+                sql = _sql_of(content) or sql
+            continue
+        if line.startswith("====="):
+            close_block()
+        elif line.startswith("Question: ") and label is None:
+            question = line[len("Question: "):]
+        elif question and line.strip().startswith("db_id:") and label is None:
+            continue
+        elif (m := LOG_LABEL_RE.match(line)) and question:
+            close_section()
+            label, buffer = m.group(1), [m.group(2)]
+        elif label is not None:
+            buffer.append(line)
+    close_block()
+
+def read_results(results_dir: str, recordings: dict):
+    for path in sorted(glob.glob(os.path.join(results_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        if result.get("question") and result.get("sql"):
+            _add(recordings, result["question"], {}, result["sql"].split("\t----- bird -----\t")[0])
+
+def read_trace(path: str, recordings: dict):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            replies = {}
+            for call in record.get("calls", []):
+                replies.setdefault(call["agent"], []).append(call["response"] or "")
+            _add(recordings, record["question"], replies, record.get("final_sql"))
+
+def load_recordings(sources) -> dict:
+    """
+    Build {question: {"replies": {agent: [replies]}, "sql": final SQL}} from the given files,
+    directories of results/*.json and glob patterns. Later sources win for the same question.
+    """
+    recordings = {}
+    for source in sources:
+        for path in sorted(glob.glob(source)) or [source]:
+            if os.path.isdir(path):
+                read_results(path, recordings)
+            elif not os.path.exists(path):
+                continue
+            elif path.endswith(".jsonl"):
+                read_trace(path, recordings)
+            else:
+                read_text_log(path, recordings)
+    return recordings
+
+_recordings: dict[tuple, dict] = {}
+_lock = threading.Lock()
+
+def get_recordings(sources) -> dict:
+    """Recordings for a source list, read once per process and shared by every agent."""
+    key = tuple(sources)
+    with _lock:
+        if key not in _recordings:
+            _recordings[key] = load_recordings(key)
+            print(f"Mock LLM: {len(_recordings[key])} recorded questions from {', '.join(key)}")
+        return _recordings[key]
+
+class MockModelClient:
+    """
+    Offline model client for the AssistantAgents (registered through register_model_client).
+    Replies come from the first matching rule of an optional "mock_script" JSON file, then from
+    recorded runs of the same question, then a fixed default. Each call sleeps for a synthetic
+    latency of "mock_latency" + "mock_latency_per_token" * reply tokens, +/- "mock_jitter" seconds.
+    """
+
+    def __init__(self, config: dict, agent_name: str = "", **kwargs):
+        self.agent_name = agent_name
+        self.model = config.get("model", "mock")
+        self.latency = float(config.get("mock_latency", 0.0))
+        self.latency_per_token = float(config.get("mock_latency_per_token", 0.0))
+        self.jitter = float(config.get("mock_jitter", 0.0))
+        self.rng = random.Random(config.get("mock_seed", 0))
+        self.recordings = get_recordings(config.get("mock_sources", DEFAULT_SOURCES))
+        self.script = []
+        if config.get("mock_script"):
+            with open(config["mock_script"], "r", encoding="utf-8") as f:
+                self.script = json.load(f)
+        # How many times each question has been asked, so repeated Refiner calls replay in order.
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def reply_for(self, prompt: str, conversation: str = "") -> str:
+        """Reply to prompt; conversation is every user turn so far, for finding the question in later turns."""
+        for rule in self.script:
+            if rule.get("agent", self.agent_name) != self.agent_name:
+                continue
+            if re.search(rule.get("match", ""), prompt, re.S):
+                return rule["reply"]
+
+        m = QUESTION_RE.search(conversation or prompt)
+        question = m.group(1).strip() if m else ""
+        with self._lock:
+            turn = self.calls.get(question, 0)
+            self.calls[question] = turn + 1
+        entry = self.recordings.get(question)
+        if entry is None:
+            return "{}" if self.agent_name == "Selector" else f"```sql\n{DEFAULT_SQL}\n```"
+
+        # Samples replay the Decomposer's recording.
+        agent = "Decomposer" if self.agent_name == "DecomposerSampler" else self.agent_name
+        replies = entry["replies"].get(agent)
+        if replies:
+            return replies[min(turn, len(replies) - 1)]
+        if self.agent_name == "Selector":
+            return "{}"
+        return f"```sql\n{entry['sql'] or DEFAULT_SQL}\n```"
+
+    def create(self, params: dict):
+        messages = params.get("messages", [])
+        prompt = messages[-1].get("content", "") if messages else ""
+        conversation = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+        content = self.reply_for(prompt or "", conversation)
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(content)
+        with self._lock:
+            jitter = self.rng.uniform(-self.jitter, self.jitter)
+        delay = self.latency + self.latency_per_token * completion_tokens + jitter
+        if delay > 0:
+            time.sleep(delay)
+        return SimpleNamespace(
+            model=self.model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content, function_call=None, tool_calls=None))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+            cost=0.0,
+        )
+
+    def message_retrieval(self, response) -> list[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response) -> dict:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": response.cost,
+            "model": response.model,
+        }
@@ -0,0 +1,74 @@
+import os
+import json
+
+FSYNC_EVERY = 10
+
+class PredictionJournal:
+    """
+    Append-only JSONL log of finished predictions keyed by dataset index.
+    Each record is flushed as soon as it is written and fsync'd in batches, so a
+    crash loses at most the questions that were still in flight.
+    """
+
+    def __init__(self, path: str, fresh: bool = False, fsync_every: int = FSYNC_EVERY):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self._unsynced = 0
+        self._file = open(path, "w" if fresh else "a", encoding="utf-8")
+        if not fresh and self._file.tell() > 0 and not _ends_with_newline(path):
+            # Terminate a torn last line so the next record starts on its own line.
+            self._file.write("\n")
+
+    def record(self, idx: int, db_id: str, sql_entry: str):
+        self._file.write(json.dumps({"idx": idx, "db_id": db_id, "sql": sql_entry}) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def read_journal(path: str) -> dict[int, str]:
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash; everything before it is intact.
+                continue
+            entries[record["idx"]] = record["sql"]
+    return entries
+
+def finalize_predictions(journal_path: str, out_path: str) -> int:
+    """Write the BIRD-format predictions file ({"0": sql_entry, ...}) from the journal."""
+    entries = read_journal(journal_path)
+    predictions = {str(idx): entries[idx] for idx in sorted(entries)}
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(predictions, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, out_path)
+    return len(predictions)
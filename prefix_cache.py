@@ -0,0 +1,49 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from metrics import estimate_tokens
+
+# Providers only cache prefixes above a minimum size and expire them after a while.
+MIN_PREFIX_TOKENS = 1024
+PREFIX_TTL = 3600.0
+MAX_PREFIXES = 256
+
+class PrefixCache:
+    """
+    Local stand-in for provider-side prefix (context) caching. Every model call starts with the
+    agent's system message plus a shared prompt prefix; when the same model saw that exact prefix
+    within the TTL, its tokens are counted as cached, as an implicit prefix cache would bill them.
+    """
+
+    def __init__(self, min_tokens: int = MIN_PREFIX_TOKENS, ttl: float = PREFIX_TTL,
+                 max_entries: int = MAX_PREFIXES):
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, model: str, system_message: str, prefix: str = "") -> int:
+        """Record a call starting with this prefix; return how many of its tokens were already cached."""
+        tokens = estimate_tokens(system_message + prefix)
+        if tokens < self.min_tokens:
+            return 0
+        key = hashlib.sha256(f"{model}\n{system_message}\n{prefix}".encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.pop(key, None)
+            self._seen[key] = now
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            if seen is not None and now - seen <= self.ttl:
+                self.hits += 1
+                return tokens
+            self.misses += 1
+            return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "prefixes": len(self._seen)}
@@ -0,0 +1,125 @@
+import re
+import math
+import time
+import threading
+from collections import Counter, OrderedDict
+from schema_retriever import load_model
+
+SIMILARITY_THRESHOLD = 0.92
+MAX_ENTRIES = 10000
+NGRAM_SIZES = (3, 4, 5)
+# Numbers, quoted strings and capitalised words after the first: paraphrases must agree on these,
+# since "customer 1" and "customer 2" look alike but have different answers.
+LITERAL_RE = re.compile(r"\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"|(?<=\s)[A-Z][\w-]*")
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s'\"]", " ", text.lower()).split())
+
+def literals(text: str) -> frozenset[str]:
+    return frozenset(m.lower() for m in LITERAL_RE.findall(text))
+
+def char_ngrams(text: str) -> dict[str, float]:
+    padded = f" {text} "
+    counts = Counter(padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1))
+    # Sublinear term frequency, L2-normalised so a dot product is the cosine similarity.
+    weights = {gram: 1 + math.log(count) for gram, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {gram: w / norm for gram, w in weights.items()}
+
+def ngram_similarity(a: dict[str, float], b: dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(gram, 0.0) for gram, w in a.items())
+
+class QuestionCache:
+    """
+    Final SQL of solved questions, bucketed by (db_id, evidence). A new question whose text is at
+    least `threshold` similar to a cached one in its bucket (character n-grams, or a
+    sentence-transformers model when requested) and mentions the same literals reuses that SQL.
+    Entries are evicted least-recently-used beyond max_entries and after ttl seconds. The cache is
+    held in memory for one run and never persisted; lookups scan every entry linearly.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_entries: int = MAX_ENTRIES,
+                 ttl: float | None = None, model_name: str | None = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # The same model instance as the schema retriever's, when both use it.
+        self.model = load_model(model_name) if model_name else None
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evictions = 0
+
+    def _vector(self, question: str):
+        text = normalize(question)
+        if self.model is not None:
+            return self.model.encode([text], normalize_embeddings=True)[0]
+        return char_ngrams(text)
+
+    def _similarity(self, a, b) -> float:
+        if self.model is not None:
+            return float(a @ b)
+        return ngram_similarity(a, b)
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.ttl is not None and now - entry["stored"] > self.ttl
+
+    def lookup(self, question: str, evidence: str, db_id: str) -> tuple[str, float, tuple] | None:
+        """Return (sql, similarity, key) of the closest cached paraphrase, or None."""
+        bucket = (db_id, normalize(evidence))
+        wanted = literals(question)
+        vector = self._vector(question)
+        now = time.monotonic()
+        best = None
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if self._expired(entry, now):
+                    del self._entries[key]
+                    self.evictions += 1
+                    continue
+                if key[:2] != bucket or entry["literals"] != wanted:
+                    continue
+                similarity = self._similarity(vector, entry["vector"])
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (entry["sql"], similarity, key)
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best[2])
+            self.hits += 1
+            return best
+
+    def invalidate(self, key: tuple):
+        """Drop an entry whose SQL no longer validates; the lookup is counted as a miss."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidated += 1
+                self.hits -= 1
+                self.misses += 1
+
+    def put(self, question: str, evidence: str, db_id: str, sql: str):
+        key = (db_id, normalize(evidence), normalize(question))
+        entry = {"sql": sql, "vector": self._vector(question), "literals": literals(question),
+                 "stored": time.monotonic()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidated": self.invalidated,
+                "evictions": self.evictions,
+            }
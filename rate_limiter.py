@@ -0,0 +1,133 @@
+import re
+import time
+import random
+import asyncio
+
+# Keys read from each model_config.json entry; they are removed before the entry reaches autogen.
+LIMIT_KEYS = ("rpm", "tpm")
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 60.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_TEXT_RE = re.compile(r"\b(429|50[0234]|resource[_ ]exhausted|quota|rate.?limit|unavailable|overloaded)\b", re.I)
+RETRY_DELAY_RE = re.compile(r"retry[_ -]?(?:after|delay|in)[\"':\s]*(\d+(?:\.\d+)?)\s*s", re.I)
+
+class TokenBucket:
+    """Continuous-refill bucket holding up to `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class Endpoint:
+    def __init__(self, index: int, rpm: float | None = None, tpm: float | None = None):
+        self.index = index
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.token_budget = TokenBucket(tpm) if tpm else None
+        self.cooldown_until = 0.0
+
+    def wait_time(self, tokens: float) -> float:
+        waits = [self.cooldown_until - time.monotonic()]
+        if self.requests:
+            waits.append(self.requests.wait_time(1))
+        if self.token_budget:
+            waits.append(self.token_budget.wait_time(tokens))
+        return max(0.0, *waits)
+
+    def take(self, tokens: float):
+        if self.requests:
+            self.requests.take(1)
+        if self.token_budget:
+            self.token_budget.take(tokens)
+
+def split_limits(config_list: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Separate the rpm/tpm keys from each config entry."""
+    configs, limits = [], []
+    for entry in config_list:
+        configs.append({k: v for k, v in entry.items() if k not in LIMIT_KEYS})
+        limits.append({k: entry[k] for k in LIMIT_KEYS if k in entry})
+    return configs, limits
+
+def status_code(exc: Exception) -> int | None:
+    for source in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "code", "status"):
+            value = getattr(source, attr, None)
+            if isinstance(value, int):
+                return value
+            if isinstance(value, str) and value.isdigit():
+                return int(value)
+    return None
+
+def is_retryable(exc: Exception) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return bool(RETRYABLE_TEXT_RE.search(str(exc)))
+
+def retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    m = RETRY_DELAY_RE.search(str(exc))
+    return float(m.group(1)) if m else None
+
+class RateLimiter:
+    """
+    Client-side limiter over the config_list entries. Each call goes to the entry that can run
+    soonest under its requests/min and tokens/min buckets. A 429/5xx puts that entry in cooldown
+    for Retry-After (or exponential backoff with full jitter) and the call moves to the next entry.
+    """
+
+    def __init__(self, limits: list[dict], max_attempts: int = MAX_ATTEMPTS):
+        self.endpoints = [Endpoint(i, limit.get("rpm"), limit.get("tpm")) for i, limit in enumerate(limits)]
+        self.max_attempts = max_attempts
+        self.retries = 0
+
+    async def _acquire(self, tokens: float) -> Endpoint:
+        while True:
+            endpoint = min(self.endpoints, key=lambda e: e.wait_time(tokens))
+            wait = endpoint.wait_time(tokens)
+            if wait <= 0:
+                endpoint.take(tokens)
+                return endpoint
+            await asyncio.sleep(wait)
+
+    async def run(self, make_call, tokens: float):
+        """
+        Await make_call(entry_index) under the limits, retrying transient failures.
+        Returns (result, number of retries it took).
+        """
+        for attempt in range(self.max_attempts):
+            endpoint = await self._acquire(tokens)
+            try:
+                return await make_call(endpoint.index), attempt
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                endpoint.cooldown_until = time.monotonic() + delay
+                self.retries += 1
+                print(f"Model call failed on config entry {endpoint.index} ({e.__class__.__name__}); "
+                      f"cooling it down for {delay:.1f}s")
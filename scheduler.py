@@ -0,0 +1,35 @@
+from collections import deque
+
+class DbAffinityQueue:
+    """
+    Pending questions grouped by db_id. A worker keeps taking questions from the database it
+    is already on, so that database's schema, prompt prefix and SQLite pages stay warm; when
+    it runs out, the worker moves to the database with the most questions left.
+    """
+
+    def __init__(self, items: list[tuple[int, dict]]):
+        self.queues: dict[str, deque] = {}
+        for idx, example in items:
+            self.queues.setdefault(example["db_id"], deque()).append((idx, example))
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def take(self, db_id: str | None = None) -> tuple[int, dict] | None:
+        queue = self.queues.get(db_id)
+        if not queue:
+            if not any(self.queues.values()):
+                return None
+            # max() keeps the first of equal-sized groups, i.e. file order breaks ties.
+            queue = max(self.queues.values(), key=len)
+        return queue.popleft()
+
+class FileOrderQueue(DbAffinityQueue):
+    """Questions in dataset order, for comparison with the affinity schedule."""
+
+    def __init__(self, items: list[tuple[int, dict]]):
+        self.queues = {None: deque(items)}
+
+    def take(self, db_id: str | None = None) -> tuple[int, dict] | None:
+        queue = self.queues[None]
+        return queue.popleft() if queue else None
@@ -1,54 +1,62 @@
 import os
 import csv
+import json
+import argparse
+from foreign_keys import get_graph
 
-def get_schema(database_dir: str, encoding: str) -> str:
+# Tried in order for each description file; BIRD ships a few cp1252 files among utf-8 ones.
+ENCODINGS = ("utf-8-sig", "cp1252")
+CATALOG_VERSION = 2
+
+def read_table_description(csv_path: str, encoding: str | None = None) -> list[dict]:
     """
-    Read schema directly from 'database_description/*.csv' and return formatted schema string.
+    Read one 'database_description/<table>.csv' into column records.
+    With no encoding given, each file is decoded with the first of ENCODINGS that works.
     """
+    encodings = (encoding,) if encoding else ENCODINGS
+    filename = os.path.basename(csv_path)
+    last_error = None
+    for enc in encodings:
+        try:
+            with open(csv_path, newline='', encoding=enc) as csvfile:
+                rows = list(csv.DictReader(csvfile))
+            break
+        except UnicodeDecodeError as e:
+            last_error = e
+    else:
+        raise last_error
+
+    columns = []
+    for row in rows:
+        column_name = (row.get("original_column_name") or "").strip()
+        if not column_name:
+            raise ValueError(f"Missing original_column_name in {filename} at row {row}")
+        columns.append({
+            "name": column_name,
+            "type": (row.get("data_format") or "").strip(),
+            "description": (row.get("column_description") or "").strip(),
+            "value_description": (row.get("value_description") or "").strip(),
+        })
+    return columns
+
+def load_tables(database_dir: str, encoding: str | None = None) -> list[dict]:
     desc_dir = os.path.join(database_dir, "database_description")
     if not os.path.exists(desc_dir):
         raise FileNotFoundError(f"No database_description folder in {database_dir}")
 
-    schema_lines = []
-    table_names = []
-    tables_data = []
-
-    # Read all tables
-    for filename in os.listdir(desc_dir):
+    tables = []
+    for filename in sorted(os.listdir(desc_dir)):
         if filename.endswith(".csv"):
-            table_name = filename[:-4]
-            table_names.append(table_name)
-
-
-            print(f"Reading {filename}...")
-
-            columns = []
-            with open(os.path.join(desc_dir, filename), newline='', encoding=encoding) as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    # print(row)
-                    column_name = row.get("original_column_name") or ""
-                    data_type = row.get("data_format", "").strip()
-                    description = row.get("column_description", "").strip()
-
-                    if not column_name:
-                        raise ValueError(f"Missing original_column_name in {filename} at row {row}")
-
-                    columns.append({
-                        "name": column_name,
-                        "type": data_type,
-                        "description": description
-                    })
-            # print(f"Table: {table_name}, Columns: {len(columns)}")
-            tables_data.append({
-                "table_name": table_name,
-                "columns": columns
+            tables.append({
+                "table_name": filename[:-4],
+                "columns": read_table_description(os.path.join(desc_dir, filename), encoding),
             })
+    return tables
 
-    # Build schema string
-    schema_lines.append(f"Allowed Tables: {', '.join(table_names)}\n")
+def render_schema(tables: list[dict]) -> str:
+    schema_lines = [f"Allowed Tables: {', '.join(table['table_name'] for table in tables)}\n"]
 
-    for table in tables_data:
+    for table in tables:
         schema_lines.append(f"Table: {table['table_name']}")
         col_lines = []
         for col in table["columns"]:
@@ -62,15 +70,153 @@ def get_schema(database_dir: str, encoding: str) -> str:
             schema_lines.append("Use only these Allowed Columns: " + ", ".join(col_lines))
         schema_lines.append("")
 
-    print("========================================================================================")
-    print("========================================================================================")
-    print("========================================================================================")
-    print("========================================================================================")
-
     return "\n".join(schema_lines).strip()
 
-# if __name__ == "__main__":
-#     # Example usage
-#     db_dir = "./data/databases/debit_card_specializing"  # Replace with your database directory
-#     schema = get_schema(db_dir)
-#     print(schema)
\ No newline at end of file
+def truncate_schema(tables: list[dict], max_chars: int) -> str:
+    """
+    Render tables in at most max_chars: drop column descriptions first, then keep
+    progressively fewer columns per table (description files list key columns first).
+    """
+    schema = render_schema(tables)
+    if len(schema) <= max_chars:
+        return schema
+    bare = [
+        {"table_name": table["table_name"], "columns": [{**col, "description": ""} for col in table["columns"]]}
+        for table in tables
+    ]
+    schema = render_schema(bare)
+    limit = max((len(table["columns"]) for table in bare), default=0)
+    while len(schema) > max_chars and limit > 1:
+        limit = max(1, limit * 3 // 4)
+        schema = render_schema([
+            {"table_name": table["table_name"], "columns": table["columns"][:limit]} for table in bare
+        ])
+    return schema
+
+def get_schema(database_dir: str, encoding: str | None = None) -> str:
+    """
+    Read schema directly from 'database_description/*.csv' and return formatted schema string.
+    """
+    return render_schema(load_tables(database_dir, encoding))
+
+# --- Selector output ---
+
+def parse_selection(reply: str) -> dict | None:
+    """
+    Extract the Selector's table -> "keep_all" | "drop_all" | [columns] mapping from its reply,
+    ignoring code fences and any text around the JSON object.
+    """
+    start, end = reply.find("{"), reply.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        selection = json.loads(reply[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(selection, dict):
+        return None
+    return selection
+
+def apply_selection(tables: list[dict], selection: dict, fk_edges=()) -> list[dict]:
+    """
+    Keep the tables and columns the Selector chose, validated against the catalog.
+    Unknown names are ignored, tables it did not mention are dropped, and the key columns of
+    foreign keys between kept tables are always retained so joins stay possible.
+    Falls back to all of tables if nothing valid remains.
+    """
+    choices = {str(name).lower(): choice for name, choice in selection.items()}
+    kept = {}
+    for table in tables:
+        choice = choices.get(table["table_name"].lower())
+        if choice is None or choice == "drop_all":
+            continue
+        if isinstance(choice, list):
+            wanted = {str(name).lower() for name in choice}
+            columns = {col["name"].lower() for col in table["columns"] if col["name"].lower() in wanted}
+            kept[table["table_name"].lower()] = columns or {col["name"].lower() for col in table["columns"]}
+        else:
+            kept[table["table_name"].lower()] = {col["name"].lower() for col in table["columns"]}
+    if not kept:
+        return tables
+
+    for t1, c1, t2, c2 in fk_edges:
+        if t1.lower() in kept and t2.lower() in kept:
+            kept[t1.lower()].add(c1.lower())
+            kept[t2.lower()].add(c2.lower())
+
+    return [
+        {"table_name": table["table_name"],
+         "columns": [col for col in table["columns"] if col["name"].lower() in kept[table["table_name"].lower()]]}
+        for table in tables if table["table_name"].lower() in kept
+    ]
+
+# --- Compiled catalog ---
+
+def _description_mtime(database_dir: str) -> float:
+    desc_dir = os.path.join(database_dir, "database_description")
+    return max((os.path.getmtime(os.path.join(desc_dir, f)) for f in os.listdir(desc_dir)), default=0.0)
+
+def compile_database(database_dir: str, data_dir: str | None = None) -> dict:
+    """Tables, rendered schema and foreign-key edges (from dev_tables.json in data_dir) of one database."""
+    db_dir, db_id = os.path.split(os.path.normpath(database_dir))
+    if data_dir is None:
+        data_dir = os.path.dirname(db_dir)
+    tables = load_tables(database_dir)
+    return {
+        "tables": tables,
+        "schema": render_schema(tables),
+        "foreign_keys": [list(edge) for edge in get_graph(data_dir, db_id).edges],
+        "mtime": _description_mtime(database_dir),
+    }
+
+def is_stale(entry: dict, database_dir: str) -> bool:
+    return entry.get("mtime", 0.0) < _description_mtime(database_dir)
+
+def build_catalog(db_dir: str, db_ids: list[str] | None = None, data_dir: str | None = None) -> dict:
+    if db_ids is None:
+        db_ids = sorted(
+            name for name in os.listdir(db_dir)
+            if os.path.isdir(os.path.join(db_dir, name, "database_description"))
+        )
+    return {
+        "version": CATALOG_VERSION,
+        "databases": {db_id: compile_database(os.path.join(db_dir, db_id), data_dir) for db_id in db_ids},
+    }
+
+def load_catalog(path: str) -> dict:
+    """Return the compiled catalog, or an empty one if the file is missing or from another version."""
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("version") == CATALOG_VERSION:
+            return catalog
+    return {"version": CATALOG_VERSION, "databases": {}}
+
+def save_catalog(catalog: dict, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def ensure_catalog(catalog: dict, db_dir: str, db_ids, data_dir: str | None = None) -> bool:
+    """Compile the listed databases that are missing or stale. Returns True if the catalog changed."""
+    changed = False
+    for db_id in db_ids:
+        database_dir = os.path.join(db_dir, db_id)
+        entry = catalog["databases"].get(db_id)
+        if entry is None or is_stale(entry, database_dir):
+            catalog["databases"][db_id] = compile_database(database_dir, data_dir)
+            changed = True
+    return changed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile every database description into one schema catalog.")
+    parser.add_argument("--db-dir", default="data/dev_databases")
+    parser.add_argument("--data-dir", default=None,
+                        help="Directory holding dev_tables.json (default: the parent of --db-dir).")
+    parser.add_argument("--out", default="data/schema_catalog.json")
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.db_dir, data_dir=args.data_dir)
+    save_catalog(catalog, args.out)
+    print(f"Compiled {len(catalog['databases'])} databases into {args.out}")
@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import Counter
+from schema_extractor import render_schema
+from foreign_keys import ForeignKeyGraph
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+INDEX_DIR = "data/schema_index"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_models = {}
+_models_lock = threading.Lock()
+
+def load_model(model_name: str):
+    """The sentence-transformers model, loaded once per process and shared; None without the package."""
+    if SentenceTransformer is None:
+        return None
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
+
+def bm25_scores(terms, docs: list[dict], lengths: list[int], df: dict) -> list[float]:
+    """Okapi BM25 score of each document (a term -> count mapping) for the query terms."""
+    n = len(docs)
+    avg_length = sum(lengths) / n if n else 0.0
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for term in set(terms):
+            tf = doc.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+        scores.append(score)
+    return scores
+
+def tokenize(text: str) -> list[str]:
+    # Split snake_case, camelCase and punctuation, then drop a plural "s" so "schools" matches "School".
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    tokens = []
+    for word in re.findall(r"[A-Za-z]+|\d+", text.lower()):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+def column_entries(tables: list[dict]) -> list[dict]:
+    entries = []
+    for table in tables:
+        for col in table["columns"]:
+            text = f"Table: {table['table_name']}, Column: {col['name']}, Description: {col['description']}"
+            if col.get("value_description"):
+                text += f", Values: {col['value_description']}"
+            entries.append({"table": table["table_name"], "column": col["name"], "text": text})
+    return entries
+
+class SchemaRetriever:
+    """
+    Ranks a database's columns against a question and renders a pruned schema.
+    Uses a sentence-transformers model when one is installed and requested, BM25 otherwise;
+    either index is cached per db_id under INDEX_DIR.
+    """
+
+    def __init__(self, db_id: str, tables: list[dict], fk_graph: ForeignKeyGraph | None = None,
+                 index_dir: str = INDEX_DIR, model_name: str | None = None):
+        self.db_id = db_id
+        self.tables = tables
+        self.fk_graph = fk_graph or ForeignKeyGraph([])
+        self.entries = column_entries(tables)
+        fingerprint = hashlib.sha256("\n".join(e["text"] for e in self.entries).encode("utf-8")).hexdigest()
+        os.makedirs(index_dir, exist_ok=True)
+
+        if model_name and SentenceTransformer is not None:
+            self.backend = "embedding"
+            # Vectors from different models differ in size and meaning, so each model gets its own file.
+            model_slug = re.sub(r"[^\w.-]", "_", model_name)
+            self._load_embeddings(os.path.join(index_dir, f"{db_id}.{model_slug}.{fingerprint[:12]}.npy"), model_name)
+        else:
+            self.backend = "bm25"
+            self._load_bm25(os.path.join(index_dir, f"{db_id}.bm25.json"), fingerprint)
+
+    def _load_embeddings(self, path: str, model_name: str):
+        import numpy as np
+
+        self.model = load_model(model_name)
+        if os.path.exists(path):
+            self.embeddings = np.load(path)
+        else:
+            texts = [entry["text"] for entry in self.entries]
+            self.embeddings = self.model.encode(texts, show_progress_bar=False, normalize_embeddings=True)
+            np.save(path, self.embeddings)
+
+    def _load_bm25(self, path: str, fingerprint: str):
+        index = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("fingerprint") != fingerprint:
+                index = None
+        if index is None:
+            docs = [Counter(tokenize(entry["text"])) for entry in self.entries]
+            df = Counter(term for doc in docs for term in doc)
+            index = {
+                "fingerprint": fingerprint,
+                "docs": [dict(doc) for doc in docs],
+                "lengths": [sum(doc.values()) for doc in docs],
+                "df": dict(df),
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+        self.docs = index["docs"]
+        self.lengths = index["lengths"]
+        self.df = index["df"]
+
+    def scores(self, query: str) -> list[float]:
+        if self.backend == "embedding":
+            query_emb = self.model.encode([query], normalize_embeddings=True)[0]
+            return list(self.embeddings @ query_emb)
+
+        return bm25_scores(tokenize(query), self.docs, self.lengths, self.df)
+
+    def retrieve(self, query: str, top_k: int = 10) -> list[dict]:
+        scores = self.scores(query)
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return [self.entries[i] for i in ranked[:top_k] if scores[i] > 0]
+
+    def prune(self, query: str, top_k: int = 30) -> list[dict]:
+        """
+        Keep the top_k columns, every table needed to join the selected tables along
+        foreign keys, and the key columns of those joins. Catalog order is preserved.
+        """
+        retrieved = self.retrieve(query, top_k)
+        if not retrieved:
+            return self.tables
+        keep = {}
+        for entry in retrieved:
+            keep.setdefault(entry["table"].lower(), set()).add(entry["column"].lower())
+
+        for table in self.fk_graph.connecting_tables(list(keep)):
+            keep.setdefault(table, set())
+        for t1, c1, t2, c2 in self.fk_graph.edges:
+            if t1.lower() in keep and t2.lower() in keep:
+                keep[t1.lower()].add(c1.lower())
+                keep[t2.lower()].add(c2.lower())
+
+        pruned = []
+        for table in self.tables:
+            wanted = keep.get(table["table_name"].lower())
+            if wanted is None:
+                continue
+            columns = [col for col in table["columns"] if col["name"].lower() in wanted]
+            pruned.append({"table_name": table["table_name"], "columns": columns or table["columns"]})
+        return pruned
+
+    def prune_schema(self, query: str, top_k: int = 30) -> str:
+        return render_schema(self.prune(query, top_k))
@@ -0,0 +1,210 @@
+import re
+from difflib import SequenceMatcher
+from sql_validator import run_sql_safely
+
+# A repair is only applied when one candidate clearly wins.
+MATCH_CUTOFF = 0.8
+MATCH_MARGIN = 0.05
+MAX_FIXES = 3
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<other>.)
+""", re.X | re.S)
+
+KEYWORDS = {
+    "select", "from", "where", "join", "inner", "left", "right", "outer", "cross", "natural", "on",
+    "using", "group", "by", "order", "having", "limit", "offset", "as", "and", "or", "not", "in",
+    "is", "null", "like", "glob", "between", "case", "when", "then", "else", "end", "distinct",
+    "all", "union", "intersect", "except", "exists", "asc", "desc", "with", "recursive", "cast",
+    "collate", "escape", "values", "true", "false", "over", "partition", "window", "filter",
+    "current_date", "current_time", "current_timestamp", "nulls", "first", "last", "rows", "range",
+}
+
+NO_SUCH_COLUMN_RE = re.compile(r"^no such column: (.+)$")
+NO_SUCH_TABLE_RE = re.compile(r"^no such table: (?:main\.)?(.+)$")
+PLAIN_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def tokenize(sql: str) -> list[dict]:
+    tokens = []
+    for m in TOKEN_RE.finditer(sql):
+        kind = m.lastgroup
+        if kind == "space":
+            continue
+        text = m.group()
+        name = None
+        if kind == "word":
+            name = text
+        elif kind == "quoted":
+            name = text[1:-1].replace(text[0] * 2, text[0]) if text[0] in "\"`" else text[1:-1]
+        tokens.append({"kind": kind, "text": text, "name": name, "start": m.start(), "end": m.end()})
+    return tokens
+
+def _is_identifier(token: dict | None) -> bool:
+    if token is None or token["name"] is None:
+        return False
+    return token["kind"] == "quoted" or token["name"].lower() not in KEYWORDS
+
+def _at(tokens: list[dict], i: int) -> dict | None:
+    return tokens[i] if 0 <= i < len(tokens) else None
+
+def _quote_like(name: str, original: dict) -> str:
+    if original["kind"] == "quoted":
+        quote = original["text"][0]
+        if quote == "[":
+            return f"[{name}]"
+        return quote + name.replace(quote, quote * 2) + quote
+    if PLAIN_IDENTIFIER_RE.match(name):
+        return name
+    return f"`{name}`"
+
+def _apply(sql: str, replacements: list[tuple[dict, str]]) -> str:
+    for token, text in sorted(replacements, key=lambda r: r[0]["start"], reverse=True):
+        sql = sql[:token["start"]] + text + sql[token["end"]:]
+    return sql
+
+def _norm(name: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+def best_match(name: str, candidates) -> str | None:
+    """Return the single candidate name is a likely misspelling of, or None if there is no clear winner."""
+    candidates = set(candidates)
+    same = [c for c in candidates if _norm(c) == _norm(name)]
+    if same:
+        return same[0] if len(same) == 1 else None
+    scored = sorted(
+        ((SequenceMatcher(None, name.lower(), c.lower()).ratio(), c) for c in candidates),
+        reverse=True,
+    )
+    if not scored or scored[0][0] < MATCH_CUTOFF:
+        return None
+    if len(scored) > 1 and scored[0][0] - scored[1][0] < MATCH_MARGIN:
+        return None
+    return scored[0][1]
+
+def table_references(tokens: list[dict], columns: dict[str, set]) -> dict[str, str]:
+    """Map every table name and alias used in the query (lower-cased) to its catalog table."""
+    by_lower = {table.lower(): table for table in columns}
+    refs = {}
+    for i, token in enumerate(tokens):
+        if not _is_identifier(token) or token["name"].lower() not in by_lower:
+            continue
+        prev = _at(tokens, i - 1)
+        if prev is not None and prev["text"] == ".":
+            continue
+        nxt = _at(tokens, i + 1)
+        if nxt is not None and nxt["text"] == ".":
+            continue
+        table = by_lower[token["name"].lower()]
+        refs[table.lower()] = table
+        alias = _at(tokens, i + 1)
+        if alias is not None and alias["text"].lower() == "as":
+            alias = _at(tokens, i + 2)
+        if _is_identifier(alias):
+            refs[alias["name"].lower()] = table
+    return refs
+
+def strip_db_prefix(sql: str, db_id: str, columns: dict[str, set]) -> str:
+    """Remove a leftover '<db_id>.' qualifier, unless db_id is also a table name."""
+    if db_id.lower() in {table.lower() for table in columns}:
+        return sql
+    tokens = tokenize(sql)
+    removals = []
+    for i, token in enumerate(tokens):
+        nxt = _at(tokens, i + 1)
+        if token["name"] and token["name"].lower() == db_id.lower() and nxt is not None and nxt["text"] == ".":
+            removals.append(({"start": token["start"], "end": nxt["end"]}, ""))
+    return _apply(sql, removals)
+
+def fix_identifier(sql: str, error: str, columns: dict[str, set]) -> tuple[str, str] | None:
+    """
+    Repair the identifier SQLite named in a 'no such column/table' error when the fix is unambiguous.
+    Returns (new_sql, description) or None.
+    """
+    tokens = tokenize(sql)
+    refs = table_references(tokens, columns)
+
+    m = NO_SUCH_TABLE_RE.match(error)
+    if m:
+        bad = m.group(1)
+        target = best_match(bad, columns)
+        if target is None:
+            return None
+        hits = [
+            (t, _quote_like(target, t)) for i, t in enumerate(tokens)
+            if t["name"] and t["name"].lower() == bad.lower()
+            and (_at(tokens, i - 1) or {}).get("text") != "."
+        ]
+        return (_apply(sql, hits), f"table {bad} -> {target}") if hits else None
+
+    m = NO_SUCH_COLUMN_RE.match(error)
+    if not m:
+        return None
+    bad = m.group(1)
+    qualifier, _, column = bad.rpartition(".")
+
+    if qualifier:
+        sites = [
+            (tokens[i - 2], tokens[i]) for i in range(2, len(tokens))
+            if tokens[i - 1]["text"] == "."
+            and tokens[i - 2]["name"] and tokens[i - 2]["name"].lower() == qualifier.lower()
+            and tokens[i]["name"] and tokens[i]["name"].lower() == column.lower()
+        ]
+        if not sites:
+            return None
+        table = refs.get(qualifier.lower())
+        target = best_match(column, columns[table]) if table else None
+        if target is not None:
+            return _apply(sql, [(col, _quote_like(target, col)) for _, col in sites]), f"column {bad} -> {qualifier}.{target}"
+        # Right column, wrong table: requalify if exactly one other referenced table has it.
+        owners = {
+            alias for alias, owner in refs.items()
+            if owner != table and column.lower() in {c.lower() for c in columns[owner]}
+        }
+        owner_tables = {refs[alias] for alias in owners}
+        if len(owner_tables) != 1:
+            return None
+        # Prefer the alias the query actually uses for that table over its bare name.
+        aliases = sorted(owners, key=lambda alias: alias == refs[alias].lower())
+        new_qualifier = next(t for t in tokens if t["name"] and t["name"].lower() == aliases[0])["name"]
+        return _apply(sql, [(qual, _quote_like(new_qualifier, qual)) for qual, _ in sites]), f"column {bad} -> {new_qualifier}.{column}"
+
+    in_scope = set().union(*(columns[table] for table in set(refs.values()))) if refs else set()
+    target = best_match(column, in_scope)
+    if target is None:
+        return None
+    hits = []
+    for i, t in enumerate(tokens):
+        if not (t["name"] and t["name"].lower() == column.lower()) or t["kind"] == "quoted" and t["text"][0] == '"':
+            continue
+        prev, nxt = _at(tokens, i - 1), _at(tokens, i + 1)
+        if (prev or {}).get("text") == "." or (nxt or {}).get("text") in (".", "("):
+            continue
+        hits.append((t, _quote_like(target, t)))
+    return (_apply(sql, hits), f"column {bad} -> {target}") if hits else None
+
+def catalog_columns(tables: list[dict]) -> dict[str, set]:
+    return {table["table_name"]: {col["name"] for col in table["columns"]} for table in tables}
+
+def autorepair(db_dir: str, db_id: str, sql: str, tables: list[dict]) -> tuple[str, list[str]]:
+    """
+    Fix misspelled or misqualified identifiers locally before the candidate is validated.
+    Every step is checked by compiling the statement, and the original SQL is returned unless
+    the repaired one compiles, so the Refiner still sees the real error for anything semantic.
+    """
+    columns = catalog_columns(tables)
+    candidate = strip_db_prefix(sql, db_id, columns)
+    fixes = ["removed db_id prefix"] if candidate != sql else []
+    for _ in range(MAX_FIXES + 1):
+        success, sql_error, _ = run_sql_safely(db_dir, db_id, candidate, mode="prepare")
+        if success:
+            return candidate, fixes
+        fixed = fix_identifier(candidate, sql_error, columns)
+        if fixed is None:
+            break
+        candidate, note = fixed
+        fixes.append(note)
+    return sql, []
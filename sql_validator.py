@@ -0,0 +1,187 @@
+import os
+import time
+import hashlib
+import sqlite3
+from db_pool import default_pool
+
+# Validation limits; main.py overrides them through configure_limits().
+QUERY_TIMEOUT = 30.0
+MAX_ROWS = 10000
+FETCH_SIZE = 500
+# Number of SQLite VM instructions between deadline checks.
+PROGRESS_STEPS = 10000
+# "prepare" only compiles candidates with EXPLAIN; "execute" also runs the ones that compile.
+VALIDATION_MODE = "execute"
+# Result checks that send an executable query back to the Refiner; none are on by default.
+SUSPICIOUS_RULES = ("empty", "null", "oversize")
+SUSPICIOUS = ()
+# "null" fires at this share of NULL cells; "oversize" at this many rows (None: MAX_ROWS).
+NULL_RATIO_LIMIT = 1.0
+OVERSIZE_ROWS = None
+PREVIEW_ROWS = 3
+# Bumped whenever result_fingerprint changes, so fingerprints stored on disk are recomputed.
+FINGERPRINT_VERSION = 2
+
+class QueryTimeoutError(Exception):
+    pass
+
+class SuspiciousResult(Exception):
+    """The query ran, but its result looks wrong (e.g. no rows or only NULLs)."""
+
+def configure_limits(timeout: float | None = None, max_rows: int | None = None, mode: str | None = None,
+                     suspicious: tuple[str, ...] | None = None, oversize_rows: int | None = None):
+    global QUERY_TIMEOUT, MAX_ROWS, VALIDATION_MODE, SUSPICIOUS, OVERSIZE_ROWS
+    if timeout is not None:
+        QUERY_TIMEOUT = timeout
+    if max_rows is not None:
+        MAX_ROWS = max_rows
+    if mode is not None:
+        VALIDATION_MODE = mode
+    if suspicious is not None:
+        unknown = set(suspicious) - set(SUSPICIOUS_RULES)
+        if unknown:
+            raise ValueError(f"Unknown result checks: {', '.join(sorted(unknown))}")
+        SUSPICIOUS = tuple(suspicious)
+    if oversize_rows is not None:
+        # Results stop at MAX_ROWS rows, so a larger threshold could never be reached.
+        if oversize_rows > MAX_ROWS:
+            raise ValueError(f"oversize_rows ({oversize_rows}) cannot exceed max_rows ({MAX_ROWS})")
+        OVERSIZE_ROWS = oversize_rows
+
+def prepare_only(conn: sqlite3.Connection, sql: str):
+    """
+    Compile sql without scanning any data. EXPLAIN makes SQLite resolve every table and column,
+    so syntax errors, unknown names and ambiguous columns fail here in microseconds.
+    """
+    conn.execute(f"EXPLAIN {sql}").close()
+
+def stream_rows(conn: sqlite3.Connection, sql: str, timeout: float, max_rows: int):
+    """
+    Run sql and yield (cursor, batch) for at most max_rows rows, FETCH_SIZE at a time. The progress
+    handler aborts the statement once the wall-clock budget is spent, which surfaces as QueryTimeoutError.
+    """
+    deadline = time.monotonic() + timeout
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        cursor = conn.execute(sql)
+        fetched = 0
+        while fetched < max_rows:
+            batch = cursor.fetchmany(min(FETCH_SIZE, max_rows - fetched))
+            if not batch:
+                break
+            fetched += len(batch)
+            yield cursor, batch
+        cursor.close()
+    except sqlite3.OperationalError as e:
+        if str(e) == "interrupted" and time.monotonic() > deadline:
+            raise QueryTimeoutError(
+                f"Query did not finish within {timeout:g}s and was interrupted; "
+                "avoid cartesian joins and unbounded scans"
+            ) from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+def execute_with_limits(conn: sqlite3.Connection, sql: str, timeout: float, max_rows: int) -> list[tuple]:
+    """Run sql under the time limit and return at most max_rows rows."""
+    rows = []
+    for _, batch in stream_rows(conn, sql, timeout, max_rows):
+        rows.extend(batch)
+    return rows
+
+def summarize_result(conn: sqlite3.Connection, sql: str, timeout: float, max_rows: int,
+                     preview_rows: int = PREVIEW_ROWS) -> dict:
+    """
+    Execute sql and describe its result without keeping it: row count (up to max_rows), column
+    names, share of NULL cells and the first preview_rows rows.
+    """
+    summary = {"rows": 0, "columns": [], "null_ratio": 0.0, "preview": [], "capped": False}
+    nulls = cells = 0
+    for cursor, batch in stream_rows(conn, sql, timeout, max_rows):
+        summary["columns"] = [column[0] for column in cursor.description or ()]
+        if len(summary["preview"]) < preview_rows:
+            summary["preview"].extend(batch[:preview_rows - len(summary["preview"])])
+        summary["rows"] += len(batch)
+        for row in batch:
+            cells += len(row)
+            nulls += sum(value is None for value in row)
+    summary["null_ratio"] = nulls / cells if cells else 0.0
+    summary["capped"] = summary["rows"] >= max_rows
+    return summary
+
+def summarize_rows(rows: list[tuple], max_rows: int | None = None, preview_rows: int = PREVIEW_ROWS) -> dict:
+    """The summarize_result description of rows that were already fetched (column names are not known)."""
+    cells = sum(len(row) for row in rows)
+    nulls = sum(value is None for row in rows for value in row)
+    return {
+        "rows": len(rows),
+        "columns": [],
+        "null_ratio": nulls / cells if cells else 0.0,
+        "preview": rows[:preview_rows],
+        "capped": len(rows) >= (max_rows or MAX_ROWS),
+    }
+
+def check_result(summary: dict, rules=None) -> str:
+    """Return why the result looks wrong under the enabled rules, or "" if it looks fine."""
+    rules = SUSPICIOUS if rules is None else rules
+    oversize = OVERSIZE_ROWS or MAX_ROWS
+    preview = f" First rows: {summary['preview']!r}" if summary["preview"] else ""
+    if "empty" in rules and summary["rows"] == 0:
+        return "The query ran but returned no rows; check the filter values and join conditions."
+    if "null" in rules and summary["rows"] and summary["null_ratio"] >= NULL_RATIO_LIMIT:
+        return (f"The query ran but {summary['null_ratio']:.0%} of the returned values are NULL; "
+                f"check the joins and the columns being selected.{preview}")
+    if "oversize" in rules and summary["rows"] >= oversize:
+        more = " or more" if summary["capped"] else ""
+        return (f"The query ran but returned {summary['rows']}{more} rows; the question probably expects "
+                f"an aggregate, a narrower filter or a LIMIT.{preview}")
+    return ""
+
+def fetch_result(db_dir: str, db_id: str, sql: str) -> tuple[bool, list[tuple] | None, str, str]:
+    """Like run_sql_safely in execute mode, but also returns the (capped) result rows."""
+    db_path = os.path.join(db_dir, db_id, f"{db_id}.sqlite")
+    if not os.path.exists(db_path):
+        return False, None, f"Database not found: {db_path}", "FileNotFoundError"
+    try:
+        with default_pool.connection(db_path) as conn:
+            prepare_only(conn, sql)
+            rows = execute_with_limits(conn, sql, QUERY_TIMEOUT, MAX_ROWS)
+        return True, rows, "", ""
+    except Exception as e:
+        return False, None, str(e), e.__class__.__name__
+
+def _normalize_value(value):
+    # BIRD compares rows with ==, under which 2 and 2.0 are the same value.
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def result_fingerprint(rows: list[tuple], multiset: bool = False) -> str:
+    """
+    Order-insensitive digest of a result set. By default rows are compared as a set, like BIRD's
+    EX metric; with multiset=True duplicate rows must also match in number. Integral floats hash
+    like the equal int, so SUM() over a REAL column can match a COUNT().
+    """
+    digest = hashlib.sha256()
+    normalized = (repr(tuple(_normalize_value(value) for value in row)) for row in rows)
+    reprs = list(normalized) if multiset else set(normalized)
+    for row in sorted(reprs):
+        digest.update(row.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def run_sql_safely(db_dir: str, db_id: str, sql: str, mode: str | None = None) -> tuple[bool, str, str]:
+    db_path = os.path.join(db_dir, db_id, f"{db_id}.sqlite")
+    if not os.path.exists(db_path):
+        return False, f"Database not found: {db_path}", "FileNotFoundError"
+    mode = mode or VALIDATION_MODE
+    try:
+        with default_pool.connection(db_path) as conn:
+            prepare_only(conn, sql)
+            if mode == "execute":
+                problem = check_result(summarize_result(conn, sql, QUERY_TIMEOUT, MAX_ROWS))
+                if problem:
+                    raise SuspiciousResult(problem)
+        return True, "", ""
+    except Exception as e:
+        return False, str(e), e.__class__.__name__
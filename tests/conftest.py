@@ -0,0 +1,42 @@
+import os
+import sys
+
+# The modules live at the repository root rather than in a package.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# agents reads the model config at import time; tests never reach a live model.
+os.environ.setdefault("MODEL_CONFIG", os.path.join(ROOT, "bench_model_config.json"))
+
+import sqlite3
+import pytest
+
+SHOP_TABLES = [
+    {"table_name": "customers", "columns": [
+        {"name": "id", "type": "integer", "description": "customer id", "value_description": ""},
+        {"name": "name", "type": "text", "description": "customer name", "value_description": ""},
+        {"name": "city", "type": "text", "description": "home city", "value_description": ""},
+    ]},
+    {"table_name": "orders", "columns": [
+        {"name": "oid", "type": "integer", "description": "order id", "value_description": ""},
+        {"name": "customer_id", "type": "integer", "description": "buyer", "value_description": ""},
+        {"name": "amount", "type": "real", "description": "order total", "value_description": ""},
+    ]},
+]
+
+@pytest.fixture
+def shop_db(tmp_path):
+    """A db_dir holding one small BIRD-style database, 'shop'. Returns (db_dir, db_id, tables)."""
+    db_dir = tmp_path / "dev_databases"
+    (db_dir / "shop").mkdir(parents=True)
+    conn = sqlite3.connect(db_dir / "shop" / "shop.sqlite")
+    conn.executescript(
+        """
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, city TEXT);
+        CREATE TABLE orders (oid INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id), amount REAL);
+        INSERT INTO customers VALUES (1, 'Ann', 'Paris'), (2, 'Bob', 'Rome'), (3, 'Cid', NULL);
+        INSERT INTO orders VALUES (1, 1, 10.0), (2, 1, 2.0), (3, 2, 7.5);
+        """
+    )
+    conn.commit()
+    conn.close()
+    return str(db_dir), "shop", SHOP_TABLES
@@ -0,0 +1,49 @@
+import json
+from evaluate import evaluate, load_predictions, report
+
+DATA = [
+    {"db_id": "shop", "question": "How many orders did Ann place?", "difficulty": "simple",
+     "SQL": "SELECT COUNT(*) FROM orders WHERE customer_id = 1"},
+    {"db_id": "shop", "question": "Which customers ordered?", "difficulty": "simple",
+     "SQL": "SELECT customer_id FROM orders"},
+    {"db_id": "shop", "question": "Who lives in Rome?", "difficulty": "moderate",
+     "SQL": "SELECT name FROM customers WHERE city = 'Rome'"},
+    {"db_id": "shop", "question": "What is the largest order?", "difficulty": "challenging",
+     "SQL": "SELECT MAX(amount) FROM orders"},
+]
+PREDICTIONS = {
+    0: "SELECT amount FROM orders WHERE oid = 2",
+    1: "SELECT DISTINCT customer_id FROM orders ORDER BY customer_id DESC",
+    2: "SELECT name FROM customers WHERE city = 'Paris'",
+    3: "SELECT MAX(amount) FROM order_lines",
+}
+
+def run(shop_db, tmp_path, **kwargs):
+    db_dir, _, _ = shop_db
+    results = evaluate(DATA, PREDICTIONS, db_dir, workers=1, timeout=5.0,
+                       gold_cache_path=str(tmp_path / "gold.json"), **kwargs)
+    return {r["idx"]: r for r in results}
+
+def test_scores_by_result_set(shop_db, tmp_path):
+    results = run(shop_db, tmp_path)
+    # 2.0 from a REAL column matches COUNT(*) = 2, and row order and duplicates do not matter.
+    assert [results[i]["correct"] for i in range(4)] == [True, True, False, False]
+    assert results[3]["status"] == "error" and "no such table" in results[3]["error"]
+    scores = report(list(results.values()))
+    assert scores["total"] == {"count": 4, "correct": 2, "ex": 50.0}
+    assert scores["simple"]["ex"] == 100.0 and scores["challenging"]["ex"] == 0.0
+
+def test_multiset_requires_duplicates(shop_db, tmp_path):
+    assert not run(shop_db, tmp_path, multiset=True)[1]["correct"]
+
+def test_gold_results_are_cached(shop_db, tmp_path):
+    run(shop_db, tmp_path)
+    with open(tmp_path / "gold.json", "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    assert len(cache["results"]) == 4
+    assert [r["correct"] for r in run(shop_db, tmp_path).values()] == [True, True, False, False]
+
+def test_load_predictions_strips_db_id(tmp_path):
+    path = tmp_path / "predictions.json"
+    path.write_text(json.dumps({"0": "SELECT 1\t----- bird -----\tshop"}), encoding="utf-8")
+    assert load_predictions(str(path)) == {0: "SELECT 1"}
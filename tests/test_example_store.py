@@ -0,0 +1,34 @@
+import json
+from example_store import ExampleStore, read_examples
+
+DATA = [
+    {"db_id": "shop", "question": "Who lives in Rome?", "evidence": ""},
+    {"db_id": "shop", "question": "Who lives in Paris?", "evidence": "Paris is a city"},
+    {"db_id": "shop", "question": "How many orders are there?", "evidence": ""},
+]
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(content), encoding="utf-8")
+
+def test_only_evaluated_correct_predictions_become_examples(tmp_path):
+    evaled = tmp_path / "evaled_results"
+    write(evaled / "predictions1.json", {"2": "SELECT COUNT(*) FROM orders\t----- bird -----\tshop"})
+    write(evaled / "older" / "eval_run1.json", {"scores": {}, "results": [
+        {"idx": 0, "db_id": "shop", "correct": True, "sql": "SELECT name FROM customers WHERE city = 'Rome'"},
+        {"idx": 1, "db_id": "shop", "correct": False, "sql": "SELECT name FROM customers"},
+        {"idx": 2, "db_id": "other", "correct": True, "sql": "SELECT 1"},
+    ]})
+    examples = read_examples(DATA, str(evaled))
+    assert examples == [{"question": "Who lives in Rome?", "evidence": "", "db_id": "shop",
+                         "sql": "SELECT name FROM customers WHERE city = 'Rome'"}]
+
+def test_search_skips_the_question_itself_and_uncompilable_sql(shop_db):
+    db_dir, _, _ = shop_db
+    store = ExampleStore([
+        {"question": "Who lives in Rome?", "evidence": "", "db_id": "shop", "sql": "SELECT name FROM customers"},
+        {"question": "Who lives in Paris?", "evidence": "", "db_id": "shop", "sql": "SELECT name FROM customers"},
+        {"question": "Who lives in Oslo?", "evidence": "", "db_id": "shop", "sql": "SELECT name FROM people"},
+    ], db_dir=db_dir)
+    assert len(store) == 2
+    assert [e["question"] for e in store.search("Who lives in Rome?", db_id="shop")] == ["Who lives in Paris?"]
@@ -0,0 +1,61 @@
+import pytest
+from llm_cache import LLMCache, CacheMiss
+
+MESSAGES = [{"role": "user", "content": "Question: how many?"}]
+
+def test_key_depends_on_every_part():
+    base = LLMCache.make_key("Decomposer", "system", "gemini", MESSAGES)
+    assert base == LLMCache.make_key("Decomposer", "system", "gemini", [dict(m) for m in MESSAGES])
+    assert base != LLMCache.make_key("Refiner", "system", "gemini", MESSAGES)
+    assert base != LLMCache.make_key("Decomposer", "other system", "gemini", MESSAGES)
+    assert base != LLMCache.make_key("Decomposer", "system", "other-model", MESSAGES)
+    assert base != LLMCache.make_key("Decomposer", "system", "gemini", [{"role": "user", "content": "x"}])
+
+def test_sample_zero_keeps_original_key():
+    base = LLMCache.make_key("Decomposer", "system", "gemini", MESSAGES)
+    assert LLMCache.make_key("Decomposer", "system", "gemini", MESSAGES, sample=0) == base
+    assert LLMCache.make_key("Decomposer", "system", "gemini", MESSAGES, sample=1) != base
+
+def test_put_get_and_replay(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = LLMCache.make_key("Selector", "system", "gemini", MESSAGES)
+    cache = LLMCache(path)
+    assert cache.get(key) is None
+    cache.put(key, "Selector", "gemini", "reply")
+    assert cache.get(key) == "reply"
+    cache.close()
+
+    replay = LLMCache(path, replay=True)
+    assert replay.get(key) == "reply"
+    # Replay never writes.
+    replay.put("other", "Selector", "gemini", "ignored")
+    assert replay.get("other") is None
+    assert replay.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    replay.close()
+
+def test_replay_needs_existing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        LLMCache(str(tmp_path / "missing.sqlite"), replay=True)
+
+def test_cache_miss_is_a_lookup_error():
+    assert issubclass(CacheMiss, LookupError)
+
+def test_max_entries_evicts_least_recently_used(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite"), max_entries=1)
+    cache.put("a", "Selector", "gemini", "first")
+    cache.put("b", "Selector", "gemini", "second")
+    cache.evict()
+    assert cache.get("b") == "second"
+    assert cache.get("a") is None
+    cache.close()
+
+def test_hits_refresh_last_used_before_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite"), max_entries=1)
+    cache.put("a", "Selector", "gemini", "first")
+    cache.put("b", "Selector", "gemini", "second")
+    assert cache.get("a") == "first"
+    # The hit on "a" is only buffered, but eviction writes it out first.
+    cache.evict()
+    assert cache.get("a") == "first"
+    assert cache.get("b") is None
+    cache.close()
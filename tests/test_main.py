@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("autogen")
+pytest.importorskip("dotenv")
+import main
+
+def test_replay_with_no_cache_is_rejected():
+    with pytest.raises(SystemExit):
+        main.parse_args(["--replay", "--no-cache"])
+
+def test_replay_alone_is_accepted():
+    assert main.parse_args(["--replay"]).replay
+
+def test_oversize_rows_above_max_rows_is_rejected():
+    with pytest.raises(SystemExit):
+        main.parse_args(["--max-rows", "100", "--oversize-rows", "101"])
+    assert main.parse_args(["--max-rows", "100", "--oversize-rows", "100"]).oversize_rows == 100
+
+def test_question_cache_hit_skips_the_agents(monkeypatch, shop_db, tmp_path):
+    import asyncio
+    import json
+    from prediction_journal import PredictionJournal, read_journal
+    from question_cache import QuestionCache
+    from schema_extractor import render_schema
+
+    db_dir, db_id, tables = shop_db
+    monkeypatch.setattr(main, "DB_DIR", db_dir)
+    monkeypatch.setattr(main, "RESULTS_DIR", str(tmp_path))
+
+    async def no_solve(*args, **kwargs):
+        raise AssertionError("a cache hit must not call the agents")
+
+    monkeypatch.setattr(main, "solve", no_solve)
+    cache = QuestionCache(threshold=0.6)
+    cache.put("Who lives in Rome?", "", db_id, "SELECT name FROM customers WHERE city = 'Rome'")
+    db_entry = {"schema": render_schema(tables), "tables": tables, "foreign_keys": []}
+    journal = PredictionJournal(str(tmp_path / "predictions.jsonl"), fresh=True)
+    example = {"db_id": db_id, "question": "Who lives in Rome ?", "evidence": ""}
+    asyncio.run(main.process_example(1, 1, example, db_entry, journal, main.parse_args([]), question_cache=cache))
+    journal.close()
+
+    sql_entry = "SELECT name FROM customers WHERE city = 'Rome'\t----- bird -----\tshop"
+    assert read_journal(str(tmp_path / "predictions.jsonl")) == {0: sql_entry}
+    with open(tmp_path / "1_shop.json", "r", encoding="utf-8") as f:
+        assert json.load(f)["schema"] == db_entry["schema"]
+    assert cache.stats()["hits"] == 1
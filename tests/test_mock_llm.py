@@ -0,0 +1,26 @@
+import json
+from mock_llm import MockModelClient
+
+def test_replies_come_from_script_then_recordings_then_default(tmp_path):
+    results = tmp_path / "results"
+    results.mkdir()
+    (results / "1_shop.json").write_text(json.dumps({
+        "question": "Who lives in Rome?", "sql": "SELECT name FROM customers WHERE city = 'Rome'\t----- bird -----\tshop",
+    }), encoding="utf-8")
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps([{"agent": "Refiner", "match": "no such table", "reply": "```sql\nSELECT 2\n```"}]),
+                      encoding="utf-8")
+    config = {"model": "mock", "mock_sources": [str(results)], "mock_script": str(script)}
+
+    decomposer = MockModelClient(config, agent_name="Decomposer")
+    assert decomposer.reply_for("[Question]\nWho lives in Rome?") == "```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```"
+    assert decomposer.reply_for("[Question]\nUnknown question") == "```sql\nSELECT 1\n```"
+    assert MockModelClient(config, agent_name="Selector").reply_for("[Question]\nUnknown question") == "{}"
+    assert MockModelClient(config, agent_name="Refiner").reply_for("[SQLite error]\nno such table: x") == "```sql\nSELECT 2\n```"
+
+def test_create_reports_usage(tmp_path):
+    client = MockModelClient({"model": "mock", "mock_sources": [str(tmp_path / "none")]}, agent_name="Decomposer")
+    response = client.create({"messages": [{"role": "user", "content": "[Question]\nAnything?"}]})
+    assert client.message_retrieval(response) == ["```sql\nSELECT 1\n```"]
+    usage = MockModelClient.get_usage(response)
+    assert usage["prompt_tokens"] > 0 and usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
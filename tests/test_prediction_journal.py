@@ -0,0 +1,36 @@
+import json
+from prediction_journal import PredictionJournal, read_journal, finalize_predictions
+
+def test_resume_appends_after_torn_line(tmp_path):
+    path = tmp_path / "predictions.jsonl"
+    with PredictionJournal(str(path), fresh=True) as journal:
+        journal.record(0, "db", "SELECT 1\t----- bird -----\tdb")
+    # Simulate a crash halfway through writing the next record.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"idx": 1, "db_id": "db", "sq')
+
+    with PredictionJournal(str(path)) as journal:
+        journal.record(2, "db", "SELECT 2\t----- bird -----\tdb")
+
+    assert read_journal(str(path)) == {
+        0: "SELECT 1\t----- bird -----\tdb",
+        2: "SELECT 2\t----- bird -----\tdb",
+    }
+
+def test_fresh_journal_discards_previous_run(tmp_path):
+    path = tmp_path / "predictions.jsonl"
+    with PredictionJournal(str(path), fresh=True) as journal:
+        journal.record(0, "db", "old")
+    with PredictionJournal(str(path), fresh=True) as journal:
+        journal.record(1, "db", "new")
+    assert read_journal(str(path)) == {1: "new"}
+
+def test_finalize_orders_by_index(tmp_path):
+    path = tmp_path / "predictions.jsonl"
+    with PredictionJournal(str(path), fresh=True) as journal:
+        for idx in (10, 2, 7):
+            journal.record(idx, "db", f"sql {idx}")
+    out = tmp_path / "predictions.json"
+    assert finalize_predictions(str(path), str(out)) == 3
+    with open(out, encoding="utf-8") as f:
+        assert list(json.load(f)) == ["2", "7", "10"]
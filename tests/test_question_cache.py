@@ -0,0 +1,30 @@
+from question_cache import QuestionCache, literals
+
+def test_paraphrase_hits_and_literals_must_match():
+    cache = QuestionCache(threshold=0.6)
+    cache.put("How many orders did customer 1 place?", "", "shop", "SELECT COUNT(*) FROM orders WHERE customer_id = 1")
+    hit = cache.lookup("How many orders has customer 1 placed?", "", "shop")
+    assert hit is not None and hit[0] == "SELECT COUNT(*) FROM orders WHERE customer_id = 1"
+    assert cache.lookup("How many orders did customer 2 place?", "", "shop") is None
+    assert cache.lookup("How many orders did customer 1 place?", "", "school") is None
+    assert cache.lookup("How many orders did customer 1 place?", "customer means buyer", "shop") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+def test_literals_include_numbers_quotes_and_names():
+    assert literals("Orders of 'Ann' in Paris above 2.5") == {"'ann'", "paris", "2.5"}
+
+def test_invalidate_turns_the_hit_into_a_miss():
+    cache = QuestionCache(threshold=0.6)
+    cache.put("List all customers", "", "shop", "SELECT name FROM customers")
+    _, _, key = cache.lookup("List all the customers", "", "shop")
+    cache.invalidate(key)
+    assert cache.lookup("List all the customers", "", "shop") is None
+    assert cache.stats() == {"entries": 0, "hits": 0, "misses": 2, "hit_rate": 0.0, "invalidated": 1, "evictions": 0}
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QuestionCache(threshold=0.99, max_entries=2)
+    for n in ("one", "two", "three"):
+        cache.put(f"question {n}", "", "shop", f"SELECT '{n}'")
+    assert cache.lookup("question one", "", "shop") is None
+    assert cache.lookup("question three", "", "shop")[0] == "SELECT 'three'"
+    assert cache.stats()["evictions"] == 1
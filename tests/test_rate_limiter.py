@@ -0,0 +1,96 @@
+import asyncio
+import time
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, is_retryable, retry_after, split_limits
+
+class ApiError(Exception):
+    def __init__(self, message, status_code=None, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+def test_split_limits_removes_rpm_and_tpm():
+    configs, limits = split_limits([{"model": "a", "rpm": 10, "tpm": 1000}, {"model": "b"}])
+    assert configs == [{"model": "a"}, {"model": "b"}]
+    assert limits == [{"rpm": 10, "tpm": 1000}, {}]
+
+def test_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(60) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    # Requests larger than the bucket wait for a full bucket rather than forever.
+    assert bucket.wait_time(600) == pytest.approx(60.0, abs=0.05)
+
+def test_retryable_errors():
+    assert is_retryable(ApiError("slow down", status_code=429))
+    assert is_retryable(ApiError("server error", status_code=503))
+    assert not is_retryable(ApiError("bad request", status_code=400))
+    assert is_retryable(RuntimeError("429 RESOURCE_EXHAUSTED"))
+    assert not is_retryable(ValueError("invalid prompt"))
+
+def test_retry_after_from_header_or_message():
+    assert retry_after(ApiError("busy", 429, {"retry-after": "7"})) == 7.0
+    assert retry_after(RuntimeError("quota exceeded, retryDelay: '12s'")) == 12.0
+    assert retry_after(RuntimeError("quota exceeded")) is None
+
+def test_failover_to_the_next_entry(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda a, b: 30.0)
+    limiter = RateLimiter([{}, {}])
+    calls = []
+
+    async def make_call(index):
+        calls.append(index)
+        if index == 0:
+            raise ApiError("rate limited", status_code=429)
+        return "ok"
+
+    assert asyncio.run(limiter.run(make_call, tokens=10)) == ("ok", 1)
+    assert calls == [0, 1]
+    assert limiter.endpoints[0].cooldown_until > time.monotonic() + 20
+    assert limiter.retries == 1
+
+def test_non_retryable_error_is_raised_at_once():
+    limiter = RateLimiter([{}, {}])
+    calls = []
+
+    async def make_call(index):
+        calls.append(index)
+        raise ApiError("bad request", status_code=400)
+
+    with pytest.raises(ApiError):
+        asyncio.run(limiter.run(make_call, tokens=10))
+    assert calls == [0]
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda a, b: 0.0)
+    limiter = RateLimiter([{}], max_attempts=3)
+    calls = []
+
+    async def make_call(index):
+        calls.append(index)
+        raise ApiError("unavailable", status_code=503)
+
+    with pytest.raises(ApiError):
+        asyncio.run(limiter.run(make_call, tokens=10))
+    assert len(calls) == 3
+
+def test_call_over_the_request_limit_waits():
+    limiter = RateLimiter([{"rpm": 2}])
+
+    async def make_call(index):
+        return index
+
+    async def scenario():
+        for _ in range(2):
+            await limiter.run(make_call, tokens=1)
+        # The third call has to wait ~30s for a request token; it is cancelled while waiting.
+        third = asyncio.create_task(limiter.run(make_call, tokens=1))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        third.cancel()
+        await asyncio.gather(third, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert limiter.endpoints[0].requests.tokens < 1
@@ -0,0 +1,31 @@
+from conftest import SHOP_TABLES
+from schema_extractor import apply_selection, parse_selection
+
+FK_EDGES = [("orders", "customer_id", "customers", "id")]
+
+def columns(tables):
+    return {table["table_name"]: [col["name"] for col in table["columns"]] for table in tables}
+
+def test_parse_selection_ignores_fences_and_prose():
+    reply = 'Here you go:\n```json\n{"customers": "keep_all", "orders": ["amount"]}\n```\nQuestion Solved.'
+    assert parse_selection(reply) == {"customers": "keep_all", "orders": ["amount"]}
+    assert parse_selection("no json here") is None
+    assert parse_selection('```json\n{"customers": "keep_all",\n```') is None
+
+def test_unknown_tables_and_columns_are_ignored():
+    selection = {"Customers": ["name", "salary"], "suppliers": "keep_all"}
+    assert columns(apply_selection(SHOP_TABLES, selection)) == {"customers": ["name"]}
+
+def test_list_of_only_unknown_columns_keeps_the_table():
+    assert columns(apply_selection(SHOP_TABLES, {"customers": ["salary"]})) == {"customers": ["id", "name", "city"]}
+
+def test_all_drop_all_falls_back_to_every_table():
+    assert apply_selection(SHOP_TABLES, {"customers": "drop_all", "orders": "drop_all"}) == SHOP_TABLES
+    assert apply_selection(SHOP_TABLES, {}) == SHOP_TABLES
+
+def test_foreign_key_columns_are_kept_for_joins():
+    selection = {"customers": ["name"], "orders": ["amount"]}
+    assert columns(apply_selection(SHOP_TABLES, selection, FK_EDGES)) == {
+        "customers": ["id", "name"], "orders": ["customer_id", "amount"]}
+    # A key column is only added when both ends of the foreign key are kept.
+    assert columns(apply_selection(SHOP_TABLES, {"orders": ["amount"]}, FK_EDGES)) == {"orders": ["amount"]}
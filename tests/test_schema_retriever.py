@@ -0,0 +1,18 @@
+from collections import Counter
+from conftest import SHOP_TABLES
+from foreign_keys import ForeignKeyGraph
+from schema_retriever import SchemaRetriever, bm25_scores
+
+def test_bm25_prefers_rare_terms_and_ignores_unmatched_docs():
+    docs = [Counter(["city", "name"]), Counter(["city", "amount"]), Counter(["order"])]
+    df = Counter(term for doc in docs for term in doc)
+    scores = bm25_scores(["amount", "city"], docs, [2, 2, 1], df)
+    assert scores[1] > scores[0] > 0
+    assert scores[2] == 0.0
+
+def test_prune_keeps_join_keys_between_retrieved_tables(tmp_path):
+    graph = ForeignKeyGraph([("orders", "customer_id", "customers", "id")])
+    retriever = SchemaRetriever("shop", SHOP_TABLES, graph, index_dir=str(tmp_path))
+    pruned = retriever.prune("order total of each customer name", top_k=2)
+    assert {t["table_name"]: [c["name"] for c in t["columns"]] for t in pruned} == {
+        "customers": ["id", "name"], "orders": ["customer_id", "amount"]}
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+
+pytest.importorskip("autogen")
+pytest.importorskip("dotenv")
+import agents
+from schema_extractor import render_schema
+
+def run_solve(monkeypatch, shop_db, replies):
+    """solve() with scripted replies per agent; returns (final SQL, the calls made)."""
+    db_dir, db_id, tables = shop_db
+    calls = []
+
+    async def fake_ask(agent, prompt, sample=0, truncated=False, prefix="", history=None):
+        calls.append({"agent": agent.name, "prompt": prompt, "history": list(history or [])})
+        return replies[agent.name].pop(0)
+
+    monkeypatch.setattr(agents, "ask", fake_ask)
+    sql = asyncio.run(agents.solve(db_dir, db_dir, "Who lives in Rome?", render_schema(tables), db_id,
+                                   tables=tables, foreign_keys=[]))
+    return sql, calls
+
+def test_refiner_replays_only_the_first_exchange(monkeypatch, shop_db):
+    sql, calls = run_solve(monkeypatch, shop_db, {
+        "Selector": ['{"customers": "keep_all"}'],
+        "Decomposer": ["```sql\nSELECT name FROM people WHERE city = 'Rome'\n```"],
+        "Refiner": ["```sql\nSELECT name FROM clients WHERE city = 'Rome'\n```",
+                    "```sql\nSELECT name FROM persons WHERE city = 'Rome'\n```",
+                    "```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```"],
+    })
+    assert sql == "SELECT name FROM customers WHERE city = 'Rome'"
+    refiner = [call for call in calls if call["agent"] == "Refiner"]
+    assert [len(call["history"]) for call in refiner] == [0, 2, 2]
+    assert "[Database info]" in refiner[0]["prompt"]
+    # Retries carry the latest candidate themselves instead of the whole conversation.
+    assert "FROM clients" in refiner[1]["prompt"] and "FROM persons" in refiner[2]["prompt"]
+    assert "[Database info]" not in refiner[2]["prompt"]
+    assert refiner[2]["history"] == refiner[1]["history"]
+
+def test_repeated_candidate_is_not_executed_again(monkeypatch, shop_db):
+    sql, calls = run_solve(monkeypatch, shop_db, {
+        "Selector": ['{"customers": "keep_all"}'],
+        "Decomposer": ["```sql\nSELECT name FROM people\n```"],
+        "Refiner": ["```sql\nSELECT name FROM people;\n```",
+                    "```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```"],
+    })
+    assert sql == "SELECT name FROM customers WHERE city = 'Rome'"
+    assert "already tried" in calls[-1]["prompt"]
+
+@pytest.fixture
+def dynamic_examples(monkeypatch):
+    messages = {agent: agent.system_message for agent in (agents.selector, agents.decomposer, agents.decomposer_sampler)}
+    monkeypatch.setattr(agents, "static_examples", "")
+    agents.configure_examples(True)
+    yield messages
+    for agent, message in messages.items():
+        agent.update_system_message(message)
+
+def test_dynamic_examples_keep_the_selector_format_example(dynamic_examples):
+    assert agents.selector.system_message == dynamic_examples[agents.selector]
+    assert "==========" not in agents.decomposer.system_message
+    assert "==========" not in agents.decomposer_sampler.system_message
+
+def test_question_without_similar_examples_gets_the_static_ones(monkeypatch, shop_db, dynamic_examples):
+    _, calls = run_solve(monkeypatch, shop_db, {
+        "Selector": ['{"customers": "keep_all"}'],
+        "Decomposer": ["```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```"],
+    })
+    decomposer_prompt = calls[1]["prompt"]
+    assert "[Worked examples]" in decomposer_prompt and "Question Solved." in decomposer_prompt
+    assert "[Worked examples]" not in calls[0]["prompt"]
+
+def test_unparseable_selection_falls_back_to_the_schema(monkeypatch, shop_db):
+    _, _, tables = shop_db
+    sql, calls = run_solve(monkeypatch, shop_db, {
+        "Selector": ["I think customers matters most."],
+        "Decomposer": ["```sql\nSELECT name FROM people WHERE city = 'Rome'\n```"],
+        "Refiner": ["```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```"],
+    })
+    assert sql == "SELECT name FROM customers WHERE city = 'Rome'"
+    for call in calls[1:]:
+        assert render_schema(tables).strip() in call["prompt"]
+        assert "I think" not in call["prompt"]
+
+def test_decomposer_answer_is_the_last_sql_block(monkeypatch, shop_db):
+    reply = ("Sub question 1: which customers live in Rome?\n```sql\nSELECT id FROM customers WHERE city = 'Rome'\n```\n"
+             "Final:\n```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```")
+    sql, calls = run_solve(monkeypatch, shop_db, {"Selector": ['{"customers": "keep_all"}'], "Decomposer": [reply]})
+    assert sql == "SELECT name FROM customers WHERE city = 'Rome'"
+    assert [call["agent"] for call in calls] == ["Selector", "Decomposer"]
+
+def test_suspicious_voted_result_goes_to_the_refiner(monkeypatch, shop_db):
+    import sql_validator
+    monkeypatch.setattr(sql_validator, "SUSPICIOUS", ("empty",))
+    monkeypatch.setattr(agents, "SAMPLES", 3)
+    empty = "```sql\nSELECT name FROM customers WHERE city = 'Roma'\n```"
+    sql, calls = run_solve(monkeypatch, shop_db, {
+        "Selector": ['{"customers": "keep_all"}'],
+        "Decomposer": [empty], "DecomposerSampler": [empty, empty],
+        "Refiner": ["```sql\nSELECT name FROM customers WHERE city = 'Rome'\n```"],
+    })
+    assert sql == "SELECT name FROM customers WHERE city = 'Rome'"
+    assert calls[-1]["agent"] == "Refiner" and "SuspiciousResult" in calls[-1]["prompt"]
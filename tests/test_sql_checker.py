@@ -0,0 +1,41 @@
+from sql_checker import autorepair, best_match, catalog_columns, fix_identifier, strip_db_prefix
+from conftest import SHOP_TABLES
+
+COLUMNS = catalog_columns(SHOP_TABLES)
+
+def test_best_match_needs_a_clear_winner():
+    assert best_match("nam", {"name", "city"}) == "name"
+    assert best_match("Customer_ID", {"customer_id", "amount"}) == "customer_id"
+    assert best_match("zzz", {"name", "city"}) is None
+    assert best_match("col1", {"col2", "col3"}) is None
+
+def test_fixes_misspelled_column():
+    sql, note = fix_identifier("SELECT nam FROM customers", "no such column: nam", COLUMNS)
+    assert sql == "SELECT name FROM customers"
+    assert note == "column nam -> name"
+
+def test_fixes_misspelled_table():
+    sql, _ = fix_identifier("SELECT name FROM customer", "no such table: customer", COLUMNS)
+    assert sql == "SELECT name FROM customers"
+
+def test_requalifies_column_from_the_other_table():
+    sql = "SELECT T1.amount FROM customers AS T1 JOIN orders AS T2 ON T1.id = T2.customer_id"
+    fixed, _ = fix_identifier(sql, "no such column: T1.amount", COLUMNS)
+    assert fixed == "SELECT T2.amount FROM customers AS T1 JOIN orders AS T2 ON T1.id = T2.customer_id"
+
+def test_leaves_string_literals_alone():
+    sql = "SELECT nam FROM customers WHERE city = 'nam'"
+    fixed, _ = fix_identifier(sql, "no such column: nam", COLUMNS)
+    assert fixed == "SELECT name FROM customers WHERE city = 'nam'"
+
+def test_strips_db_prefix():
+    assert strip_db_prefix("SELECT name FROM shop.customers", "shop", COLUMNS) == "SELECT name FROM customers"
+
+def test_autorepair_compiles_the_result(shop_db):
+    db_dir, db_id, tables = shop_db
+    assert autorepair(db_dir, db_id, "SELECT nam FROM shop.customers", tables) == (
+        "SELECT name FROM customers", ["removed db_id prefix", "column nam -> name"])
+
+def test_autorepair_returns_original_when_unfixable(shop_db):
+    db_dir, db_id, tables = shop_db
+    assert autorepair(db_dir, db_id, "SELECT zzz FROM customers", tables) == ("SELECT zzz FROM customers", [])
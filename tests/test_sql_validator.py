@@ -0,0 +1,79 @@
+import pytest
+from sql_validator import fetch_result, result_fingerprint
+
+def test_fingerprint_ignores_row_order():
+    assert result_fingerprint([(1, "a"), (2, "b")]) == result_fingerprint([(2, "b"), (1, "a")])
+    assert result_fingerprint([(1, "a")]) != result_fingerprint([(1, "b")])
+
+def test_fingerprint_compares_sets_unless_multiset():
+    assert result_fingerprint([(1,), (1,)]) == result_fingerprint([(1,)])
+    assert result_fingerprint([(1,), (1,)], multiset=True) != result_fingerprint([(1,)], multiset=True)
+
+def test_fetch_result_returns_rows_or_error(shop_db):
+    db_dir, db_id, _ = shop_db
+    assert fetch_result(db_dir, db_id, "SELECT name FROM customers WHERE id = 1") == (True, [("Ann",)], "", "")
+    success, rows, error, exception_class = fetch_result(db_dir, db_id, "SELECT nope FROM customers")
+    assert (success, rows, exception_class) == (False, None, "OperationalError")
+    assert "no such column" in error
+
+def test_fingerprint_treats_integral_floats_as_ints():
+    assert result_fingerprint([(2,)]) == result_fingerprint([(2.0,)])
+    assert result_fingerprint([(2,)]) != result_fingerprint([(2.5,)])
+    assert result_fingerprint([("2",)]) != result_fingerprint([(2,)])
+
+def test_oversize_threshold_must_fit_under_max_rows(monkeypatch):
+    import sql_validator
+    monkeypatch.setattr(sql_validator, "MAX_ROWS", 100)
+    monkeypatch.setattr(sql_validator, "OVERSIZE_ROWS", None)
+    with pytest.raises(ValueError):
+        sql_validator.configure_limits(oversize_rows=101)
+
+def test_cartesian_join_times_out_within_budget():
+    import sqlite3
+    import time
+    from sql_validator import QueryTimeoutError, execute_with_limits
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", ((i,) for i in range(2000)))
+    started = time.monotonic()
+    with pytest.raises(QueryTimeoutError):
+        execute_with_limits(conn, "SELECT COUNT(*) FROM t a, t b, t c", timeout=0.5, max_rows=10)
+    assert time.monotonic() - started < 1.5
+    # The handler is removed afterwards, so the connection stays usable.
+    assert execute_with_limits(conn, "SELECT COUNT(*) FROM t", timeout=0.5, max_rows=10) == [(2000,)]
+
+def summarize(shop_db, sql, max_rows=100):
+    import os
+    import sqlite3
+    from sql_validator import summarize_result
+    db_dir, db_id, _ = shop_db
+    conn = sqlite3.connect(os.path.join(db_dir, db_id, f"{db_id}.sqlite"))
+    try:
+        return summarize_result(conn, sql, timeout=5.0, max_rows=max_rows)
+    finally:
+        conn.close()
+
+def test_summary_and_checks_for_an_empty_result(shop_db):
+    from sql_validator import check_result
+    summary = summarize(shop_db, "SELECT name FROM customers WHERE id = 9")
+    assert (summary["rows"], summary["preview"], summary["capped"]) == (0, [], False)
+    assert "no rows" in check_result(summary, ("empty",))
+    assert check_result(summary, ()) == ""
+
+def test_summary_and_checks_for_all_null_values(shop_db):
+    from sql_validator import check_result
+    summary = summarize(shop_db, "SELECT city FROM customers WHERE id = 3")
+    assert (summary["rows"], summary["columns"], summary["null_ratio"]) == (1, ["city"], 1.0)
+    assert "100% of the returned values are NULL" in check_result(summary, ("null",))
+    assert check_result(summarize(shop_db, "SELECT city FROM customers"), ("null",)) == ""
+
+def test_summary_and_checks_for_a_capped_result(shop_db, monkeypatch):
+    import sql_validator
+    from sql_validator import check_result, summarize_rows
+    monkeypatch.setattr(sql_validator, "MAX_ROWS", 2)
+    monkeypatch.setattr(sql_validator, "OVERSIZE_ROWS", None)
+    summary = summarize(shop_db, "SELECT name FROM customers", max_rows=2)
+    assert (summary["rows"], summary["capped"], summary["preview"]) == (2, True, [("Ann",), ("Bob",)])
+    assert "returned 2 or more rows" in check_result(summary, ("oversize",))
+    # Rows fetched elsewhere are described the same way, apart from the column names.
+    assert summarize_rows([("Ann",), ("Bob",)]) == {**summary, "columns": []}
@@ -0,0 +1,13 @@
+from value_index import open_value_index, render_value_hints
+
+def test_hints_show_matched_values_and_numeric_ranges(shop_db, tmp_path):
+    db_dir, db_id, _ = shop_db
+    index = open_value_index(db_dir, db_id, index_dir=str(tmp_path / "value_index"))
+    try:
+        text = "Which customers from Paris placed an order with amount above 5?"
+        assert index.lookup(text) == {("customers", "city"): ["Paris"]}
+        assert index.ranges(text) == {("orders", "amount"): (2.0, 10.0)}
+        assert render_value_hints(index.lookup(text), index.ranges(text)) == (
+            "customers.`city`: 'Paris'\norders.`amount`: from 2.0 to 10.0")
+    finally:
+        index.close()
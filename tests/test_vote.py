@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+
+pytest.importorskip("autogen")
+pytest.importorskip("dotenv")
+import agents
+
+def run_vote(monkeypatch, shop_db, replies, samples, quorum=None):
+    """Vote over scripted Decomposer replies (one per sample; an exception is raised instead)."""
+    db_dir, db_id, _ = shop_db
+    asked = []
+
+    async def fake_ask(agent, prompt, sample=0, **kwargs):
+        asked.append(sample)
+        reply = replies[sample]
+        if isinstance(reply, Exception):
+            raise reply
+        return f"```sql\n{reply}\n```"
+
+    monkeypatch.setattr(agents, "ask", fake_ask)
+    monkeypatch.setattr(agents, "SAMPLES", samples)
+    monkeypatch.setattr(agents, "QUORUM", quorum)
+    return asyncio.run(agents.vote(db_dir, db_id, "prompt", None)), asked
+
+def test_majority_result_wins(monkeypatch, shop_db):
+    (sql, success, _, _), _ = run_vote(monkeypatch, shop_db, [
+        "SELECT name FROM customers WHERE id = 2",
+        "SELECT name FROM customers WHERE id = 1",
+        "SELECT name FROM customers WHERE city = 'Paris'",
+    ], samples=3)
+    assert (sql, success) == ("SELECT name FROM customers WHERE id = 1", True)
+
+def test_unanimous_samples_stop_at_quorum(monkeypatch, shop_db):
+    _, asked = run_vote(monkeypatch, shop_db, ["SELECT name FROM customers WHERE id = 1"] * 5, samples=5)
+    assert sorted(asked) == [0, 1, 2]
+
+def test_failed_sample_is_replaced_and_does_not_vote(monkeypatch, shop_db):
+    (sql, success, _, _), asked = run_vote(monkeypatch, shop_db, [
+        "SELECT name FROM customers WHERE id = 1",
+        RuntimeError("model unavailable"),
+        "SELECT name FROM customers WHERE city = 'Paris'",
+    ], samples=3)
+    assert (sql, success) == ("SELECT name FROM customers WHERE id = 1", True)
+    assert sorted(asked) == [0, 1, 2]
+
+def test_empty_results_do_not_win(monkeypatch, shop_db):
+    (sql, success, _, _), _ = run_vote(monkeypatch, shop_db, [
+        "SELECT name FROM customers WHERE id = 9",
+        "SELECT city FROM customers WHERE id = 3",
+        "SELECT name FROM customers WHERE id = 2",
+    ], samples=3)
+    assert (sql, success) == ("SELECT name FROM customers WHERE id = 2", True)
+
+def test_no_executable_candidate_returns_first_error(monkeypatch, shop_db):
+    (sql, success, error, _), _ = run_vote(monkeypatch, shop_db, [
+        "SELECT nope FROM customers", "SELECT nope2 FROM customers"], samples=2)
+    assert (sql, success) == ("SELECT nope FROM customers", False)
+    assert "no such column" in error
+
+def test_all_samples_failing_raises(monkeypatch, shop_db):
+    with pytest.raises(RuntimeError):
+        run_vote(monkeypatch, shop_db, [RuntimeError("down"), RuntimeError("down")], samples=2)
+
+def test_suspicious_checks_apply_to_the_voted_result(monkeypatch, shop_db):
+    import sql_validator
+    monkeypatch.setattr(sql_validator, "SUSPICIOUS", ("empty",))
+    (sql, success, error, exception_class), _ = run_vote(
+        monkeypatch, shop_db, ["SELECT name FROM customers WHERE id = 9"] * 3, samples=3)
+    assert (sql, success, exception_class) == ("SELECT name FROM customers WHERE id = 9", False, "SuspiciousResult")
+    assert "no rows" in error
+
+def test_oversize_winner_is_suspicious(monkeypatch, shop_db):
+    import sql_validator
+    monkeypatch.setattr(sql_validator, "SUSPICIOUS", ("oversize",))
+    monkeypatch.setattr(sql_validator, "OVERSIZE_ROWS", 3)
+    (_, success, error, exception_class), _ = run_vote(monkeypatch, shop_db, ["SELECT name FROM customers"] * 3, samples=3)
+    assert (success, exception_class) == (False, "SuspiciousResult")
+    assert "returned 3 rows" in error
+
+def test_results_pass_when_no_checks_are_enabled(monkeypatch, shop_db):
+    (_, success, _, _), _ = run_vote(monkeypatch, shop_db, ["SELECT name FROM customers WHERE id = 9"] * 3, samples=3)
+    assert success
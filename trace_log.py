@@ -0,0 +1,100 @@
+import os
+import json
+import queue
+import hashlib
+import threading
+from contextvars import ContextVar
+
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 1.0
+
+# Trace record of the question the current task is solving; agent calls append to its "calls".
+current_trace: ContextVar[dict | None] = ContextVar("current_trace", default=None)
+
+def prompt_hash(system_message: str, prompt: str) -> str:
+    return hashlib.sha256(f"{system_message}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+def record_call(agent: str, system_message: str, prompt: str, response: str, latency: float, cached: bool):
+    trace = current_trace.get()
+    if trace is None:
+        return
+    trace["calls"].append({
+        "agent": agent,
+        "prompt_hash": prompt_hash(system_message, prompt),
+        "prompt_chars": len(prompt),
+        "response": response,
+        "latency": round(latency, 4),
+        "cached": cached,
+    })
+
+def record_attempt(stage: str, sql: str, success: bool, sql_error: str = "", exception_class: str = ""):
+    trace = current_trace.get()
+    if trace is None:
+        return
+    trace["attempts"].append({
+        "stage": stage,
+        "sql": sql,
+        "success": success,
+        "error": sql_error,
+        "exception_class": exception_class,
+    })
+
+def annotate(**fields):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.update(fields)
+
+def new_trace(idx: int, db_id: str, question: str) -> dict:
+    return {"question_id": idx, "db_id": db_id, "question": question, "calls": [], "attempts": []}
+
+class TraceWriter:
+    """
+    JSONL sink for per-question trace records. emit() only enqueues; a background thread
+    writes records in batches, so the solving loop never waits on file I/O.
+    """
+
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: dict):
+        self._queue.put(record)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            done = False
+            while not done:
+                batch = []
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+                if None in batch:
+                    done = True
+                    batch = [record for record in batch if record is not None]
+                if batch:
+                    f.write("".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch))
+                    f.flush()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+tracer: TraceWriter | None = None
+
+def configure_tracer(writer: TraceWriter | None):
+    global tracer
+    tracer = writer
+
+def emit(record: dict):
+    if tracer is not None:
+        tracer.emit(record)
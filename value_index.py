@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import sqlite3
+import argparse
+import threading
+from urllib.request import pathname2url
+
+INDEX_DIR = "data/value_index"
+SAMPLE_SIZE = 5
+MAX_DISTINCT = 50000
+MAX_VALUE_LENGTH = 80
+MAX_MATCHES = 20
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "by", "with", "from", "and", "or", "not",
+    "is", "are", "was", "were", "be", "been", "has", "have", "had", "do", "does", "did", "what", "which",
+    "who", "whom", "whose", "when", "where", "how", "many", "much", "list", "give", "name", "names",
+    "show", "find", "please", "all", "any", "each", "their", "there", "that", "this", "these", "those",
+    "it", "its", "as", "than", "more", "most", "less", "least", "number", "refers", "refer", "among",
+}
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _fts5_available(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def build_value_index(db_path: str, index_path: str):
+    """
+    Scan every column of db_path once and write a compact index next to it: distinct-value samples,
+    min/max for numeric columns and a full-text index of short text values.
+    """
+    source = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    index = sqlite3.connect(tmp_path)
+    fts = _fts5_available(index)
+    index.execute(
+        "CREATE TABLE column_stats (tbl TEXT, col TEXT, kind TEXT, min_value, max_value, samples TEXT, "
+        "PRIMARY KEY (tbl, col))"
+    )
+    if fts:
+        index.execute("CREATE VIRTUAL TABLE column_values USING fts5(value, tbl UNINDEXED, col UNINDEXED)")
+    else:
+        index.execute("CREATE TABLE column_values (value TEXT, tbl TEXT, col TEXT)")
+        index.execute("CREATE INDEX column_values_value ON column_values (value COLLATE NOCASE)")
+
+    tables = [row[0] for row in source.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        for _, column, *_ in source.execute(f"PRAGMA table_info({_quote(table)})").fetchall():
+            qcol, qtable = _quote(column), _quote(table)
+            samples = [row[0] for row in source.execute(
+                f"SELECT {qcol} FROM {qtable} WHERE {qcol} IS NOT NULL "
+                f"GROUP BY {qcol} ORDER BY COUNT(*) DESC LIMIT {SAMPLE_SIZE}")]
+            kinds = {row[0] for row in source.execute(
+                f"SELECT DISTINCT typeof({qcol}) FROM (SELECT {qcol} FROM {qtable} WHERE {qcol} IS NOT NULL LIMIT 1000)")}
+            kind = "numeric" if kinds and kinds <= {"integer", "real"} else "text"
+            min_value = max_value = None
+            if kind == "numeric":
+                min_value, max_value = source.execute(f"SELECT MIN({qcol}), MAX({qcol}) FROM {qtable}").fetchone()
+            else:
+                values = source.execute(
+                    f"SELECT DISTINCT {qcol} FROM {qtable} WHERE typeof({qcol}) = 'text' "
+                    f"AND length({qcol}) <= {MAX_VALUE_LENGTH} LIMIT {MAX_DISTINCT}")
+                index.executemany(
+                    "INSERT INTO column_values (value, tbl, col) VALUES (?, ?, ?)",
+                    ((value, table, column) for (value,) in values),
+                )
+            index.execute(
+                "INSERT INTO column_stats VALUES (?, ?, ?, ?, ?, ?)",
+                (table, column, kind, min_value, max_value,
+                 json.dumps([v if isinstance(v, (int, float, str)) else repr(v) for v in samples])),
+            )
+    index.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    index.execute("INSERT INTO meta VALUES ('fts5', ?)", ("1" if fts else "0",))
+    index.commit()
+    index.close()
+    source.close()
+    os.replace(tmp_path, index_path)
+
+def keywords(text: str) -> list[str]:
+    quoted = re.findall(r"'([^']+)'|\"([^\"]+)\"", text)
+    words = [w for w in re.findall(r"[A-Za-z0-9][A-Za-z0-9\-]*", text) if w.lower() not in STOPWORDS and len(w) > 1]
+    phrases = [a or b for a, b in quoted]
+    return list(dict.fromkeys(phrases + words))
+
+class ValueIndex:
+    """Read side of a built value index; lookups take a few milliseconds."""
+
+    def __init__(self, index_path: str):
+        self._conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(index_path))}?mode=ro",
+                                     uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.fts = self._conn.execute("SELECT value FROM meta WHERE key = 'fts5'").fetchone()[0] == "1"
+        self.numeric = {
+            (tbl, col): (lo, hi) for tbl, col, kind, lo, hi, _ in self._conn.execute(
+                "SELECT tbl, col, kind, min_value, max_value, samples FROM column_stats")
+            if kind == "numeric" and lo is not None
+        }
+
+    def stats(self) -> dict[tuple[str, str], dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT tbl, col, kind, min_value, max_value, samples FROM column_stats").fetchall()
+        return {
+            (tbl, col): {"kind": kind, "min": lo, "max": hi, "samples": json.loads(samples)}
+            for tbl, col, kind, lo, hi, samples in rows
+        }
+
+    def lookup(self, text: str, limit: int = MAX_MATCHES) -> dict[tuple[str, str], list[str]]:
+        """Stored text values matching the keywords of text, grouped by (table, column)."""
+        terms = keywords(text)
+        if not terms:
+            return {}
+        with self._lock:
+            if self.fts:
+                query = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                rows = self._conn.execute(
+                    "SELECT tbl, col, value FROM column_values WHERE column_values MATCH ? ORDER BY rank LIMIT ?",
+                    (query, limit),
+                ).fetchall()
+            else:
+                placeholders = ", ".join("?" for _ in terms)
+                rows = self._conn.execute(
+                    f"SELECT tbl, col, value FROM column_values WHERE value COLLATE NOCASE IN ({placeholders}) LIMIT ?",
+                    (*terms, limit),
+                ).fetchall()
+        matches = {}
+        for tbl, col, value in rows:
+            matches.setdefault((tbl, col), []).append(value)
+        return matches
+
+    def ranges(self, text: str) -> dict[tuple[str, str], tuple]:
+        """Min/max of the numeric columns whose name shares a word with the keywords of text."""
+        terms = {term.lower() for term in keywords(text)}
+        return {
+            (tbl, col): bounds for (tbl, col), bounds in self.numeric.items()
+            if terms & set(re.findall(r"[a-z0-9]+", col.lower()))
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def render_value_hints(matches: dict[tuple[str, str], list[str]], ranges: dict[tuple[str, str], tuple] | None = None) -> str:
+    lines = []
+    for (tbl, col), values in matches.items():
+        shown = ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+        lines.append(f"{tbl}.`{col}`: {shown}")
+    for (tbl, col), (lo, hi) in (ranges or {}).items():
+        lines.append(f"{tbl}.`{col}`: from {lo} to {hi}")
+    return "\n".join(lines)
+
+def open_value_index(db_dir: str, db_id: str, index_dir: str = INDEX_DIR) -> ValueIndex:
+    """Open the index for db_id, building it first if it is missing or older than the database."""
+    db_path = os.path.join(db_dir, db_id, f"{db_id}.sqlite")
+    index_path = os.path.join(index_dir, f"{db_id}.values.sqlite")
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(db_path):
+        os.makedirs(index_dir, exist_ok=True)
+        print(f"Building value index for {db_id}...")
+        build_value_index(db_path, index_path)
+    return ValueIndex(index_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the per-database value indexes used for literal grounding.")
+    parser.add_argument("--db-dir", default="data/dev_databases")
+    parser.add_argument("--out", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    for db_id in sorted(os.listdir(args.db_dir)):
+        if os.path.exists(os.path.join(args.db_dir, db_id, f"{db_id}.sqlite")):
+            open_value_index(args.db_dir, db_id, args.out).close()